@@ -0,0 +1,80 @@
+'''
+Output size and uproot read time of single-valued quantities booked as
+std::vector<float> branches (the old LHE2Root layout) versus plain Float_t /
+Int_t leaves (heptools.root_branches.ScalarBranch).
+
+    python benchmarks/branch_schema.py --nevents 1000000
+'''
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import uproot
+from ROOT import TFile, TTree, vector
+
+from heptools.root_branches import ScalarBranch
+
+
+FLOAT_BRANCHES = ["weights", "ttbar_pt", "ttbar_eta", "ttbar_phi", "ttbar_e", "ttbar_m", "ttbar_y",
+                  "cosp_hel", "cosm_hel", "cosp_raxis", "cosm_raxis", "cosp_trans", "cosm_trans", "dphi_ll"]
+INT_BRANCHES   = ["onshell_top", "onshell_tbar"]
+
+
+def write(file_name, values, scalar):
+
+    outfile = TFile(file_name, "recreate")
+    outtree = TTree("events", "events")
+    branches = {}
+    for name, column in values.items():
+        branch_type = 'int' if column.dtype == np.int32 else 'float'
+        if scalar:
+            branches[name] = ScalarBranch(name, branch_type, outtree)
+        else:
+            branches[name] = vector(branch_type)(20)
+            outtree.Branch(name, branches[name])
+
+    # Python scalars, as LHE2Root pushes: std::vector<int>::push_back does not take NumPy integers
+    columns = {name: column.tolist() for name, column in values.items()}
+    for i in range(len(values["weights"])):
+        for name, branch in branches.items():
+            branch.resize(0)
+            branch.push_back(columns[name][i])
+        outtree.Fill()
+
+    outfile.Write()
+    outfile.Close()
+
+
+def read(file_name):
+
+    t0 = time.perf_counter()
+    with uproot.open(file_name) as f:
+        f["events"].arrays(library="ak")
+    return time.perf_counter() - t0
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nevents", help = "Number of events", type = int, default = 200000)
+    parser.add_argument("--repeat",  help = "Read repetitions (best time is quoted)", type = int, default = 3)
+    args = parser.parse_args()
+
+    rng    = np.random.default_rng(1)
+    values = {name: rng.normal(size=args.nevents).astype(np.float32) for name in FLOAT_BRANCHES}
+    values.update({name: rng.integers(0, 2, size=args.nevents).astype(np.int32) for name in INT_BRANCHES})
+
+    with tempfile.TemporaryDirectory() as outdir:
+        print(f"{'layout':<10}{'size [MB]':>11}{'read [s]':>10}")
+        for layout, scalar in (("vector", False), ("scalar", True)):
+            file_name = os.path.join(outdir, f"{layout}.root")
+            write(file_name, values, scalar)
+            dt = min(read(file_name) for _ in range(args.repeat))
+            print(f"{layout:<10}{os.path.getsize(file_name)/1e6:>11.2f}{dt:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
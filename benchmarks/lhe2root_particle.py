@@ -0,0 +1,122 @@
+'''
+Per-event cost of building LHE2Root.particle records and reading the
+quantities push2ROOT writes, for the previous eager implementation (every
+kinematic quantity computed in __init__, per-instance __dict__) and the
+current lazy __slots__ one.
+
+    python benchmarks/lhe2root_particle.py --nevents 100000
+'''
+
+import argparse
+import sys
+import time
+import tracemalloc
+from math import log, tan, acos, copysign
+
+import numpy as np
+
+
+class EagerParticle(object):
+
+    """ LHE2Root.particle before the lazy __slots__ version """
+
+    def __init__(self, index, pid, status, mother1, mother2, color1, color2, px, py, pz, e, mass, f1, spin):
+        self.index    = index
+        self.pid      = pid
+        self.status   = status
+        self.mother1  = mother1
+        self.mother2  = mother2
+        self.color1   = color1
+        self.color2   = color2
+        self.px       = px
+        self.py       = py
+        self.pz       = pz
+        self.e        = e
+        self.m        = mass
+        self.f1       = f1
+        self.spin     = spin
+
+        self.p2      = self.px**2 + self.py**2 + self.pz**2
+        self.p       = self.p2 ** 0.5
+        self.pt      = (self.px**2 + self.py**2)**0.5
+        self.theta   = acos(self.pz / self.p)
+        try:
+            self.phi = copysign( acos(self.px / self.pt), self.py )
+        except ZeroDivisionError:
+            self.phi = 0.
+        try:
+            self.eta = -log(tan(self.theta / 2.))
+        except ValueError:
+            self.eta = copysign(9999.0, self.pz / self.p)
+        try:
+            self.y   = 0.5*log((self.e + self.pz)/(self.e - self.pz))
+        except (ZeroDivisionError, ValueError):
+            self.y   = 0
+
+        self.helicity = 0
+        if self.spin * self.pz > 0:
+            self.helicity = -3
+        else:
+            self.helicity = 3
+
+
+# A dileptonic ttbar event: the two incoming partons, t, tbar, W+, W-, b, bbar, l+, v, l-, vbar
+EVENT_PIDS = [21, 21, 6, -6, 24, -24, 5, -5, -11, 12, 13, -14]
+
+# Particles whose kinematics push2ROOT writes (pt, eta, phi, e, m; tops also y)
+WRITTEN_PIDS = {6, -6, 5, -5, 24, -24, 11, -11, 13, -13, 12, -12, 14, -14, 21, -21}
+
+
+def make_records(nevents, seed=1):
+
+    rng      = np.random.default_rng(seed)
+    momenta  = rng.normal(0., 100., size=(nevents, len(EVENT_PIDS), 3))
+    masses   = np.where(np.abs(EVENT_PIDS) == 6, 172.5, np.where(np.abs(EVENT_PIDS) == 24, 80.4, 0.))
+    energies = np.sqrt((momenta**2).sum(axis=-1) + masses**2)
+    spins    = rng.choice([-1., 1.], size=(nevents, len(EVENT_PIDS)))
+    return [[(i, pid, 1, 0, 0, 0, 0, *map(float, momenta[n, i]), float(energies[n, i]), float(masses[i]), 0., float(spins[n, i]))
+             for i, pid in enumerate(EVENT_PIDS)] for n in range(nevents)]
+
+
+def run(particle, records):
+
+    """ Builds every particle and reads the same quantities as push2ROOT """
+
+    total = 0.
+    for event in records:
+        particles = [particle(*record) for record in event]
+        for counter, p in enumerate(particles):
+            if counter < 2:
+                total += p.pz + p.pid + p.helicity + p.spin
+            elif p.pid in WRITTEN_PIDS:
+                total += p.pt + p.eta + p.phi + p.e + p.m
+                if abs(p.pid) == 6:
+                    total += p.y
+    return total
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nevents", help = "Number of events", type = int, default = 100000)
+    args = parser.parse_args()
+
+    sys.argv = sys.argv[:1] # LHE2Root parses the command line on import
+    from heptools.LHE2Root import particle
+
+    records = make_records(args.nevents)
+    print(f"{'particle':<8}{'us/event':>10}{'bytes/particle':>16}")
+    for name, cls in (("eager", EagerParticle), ("lazy", particle)):
+        t0 = time.perf_counter()
+        run(cls, records)
+        dt = time.perf_counter() - t0
+
+        tracemalloc.start()
+        kept = [cls(*record) for event in records[:1000] for record in event]
+        size = tracemalloc.get_traced_memory()[0] / len(kept)
+        tracemalloc.stop()
+        print(f"{name:<8}{1e6*dt/args.nevents:>10.2f}{size:>16.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+'''
+Throughput of reading + XML-parsing an LHE file through heptools.LHEio.open_lhe,
+for the uncompressed file and gzip / xz / zstd copies of it, with and without
+the background decompression thread.
+
+    python benchmarks/lhe_decompression.py events.lhe
+'''
+
+import argparse
+import gzip
+import lzma
+import os
+import shutil
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+
+from heptools.LHEio import open_lhe
+
+
+def compress(infile, outdir):
+
+    """ Writes the compressed copies of infile which can be made in this environment """
+
+    copies = {"plain": infile}
+
+    copies["gzip"] = os.path.join(outdir, "events.lhe.gz")
+    with open(infile, "rb") as fin, gzip.open(copies["gzip"], "wb", compresslevel=6) as fout:
+        shutil.copyfileobj(fin, fout)
+
+    copies["xz"] = os.path.join(outdir, "events.lhe.xz")
+    with open(infile, "rb") as fin, lzma.open(copies["xz"], "wb", preset=1) as fout:
+        shutil.copyfileobj(fin, fout)
+
+    try:
+        import zstandard
+        copies["zstd"] = os.path.join(outdir, "events.lhe.zst")
+        with open(infile, "rb") as fin, open(copies["zstd"], "wb") as fout:
+            zstandard.ZstdCompressor().copy_stream(fin, fout)
+    except ImportError:
+        print("zstandard not installed, skipping zstd")
+
+    return copies
+
+
+def parse(file_name, threaded):
+
+    nevents = 0
+    with open_lhe(file_name, threaded=threaded) as source:
+        for _, elem in ET.iterparse(source):
+            if elem.tag == "event":
+                nevents += 1
+            elem.clear()
+    return nevents
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("infile", help="Uncompressed LHE file")
+    args = parser.parse_args()
+
+    size = os.path.getsize(args.infile) / 1e6
+
+    with tempfile.TemporaryDirectory() as outdir:
+        copies = compress(args.infile, outdir)
+        print(f"{'input':<8}{'thread':>8}{'on disk [MB]':>14}{'time [s]':>10}{'MB/s':>8}{'events/s':>10}")
+        for name, file_name in copies.items():
+            for threaded in ((False,) if name == "plain" else (False, True)):
+                t0      = time.perf_counter()
+                nevents = parse(file_name, threaded)
+                dt      = time.perf_counter() - t0
+                print(f"{name:<8}{str(threaded):>8}{os.path.getsize(file_name)/1e6:>14.1f}{dt:>10.2f}{size/dt:>8.1f}{nevents/dt:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+'''
+Cost of LHEparse.build() on a synthetic wide sample (many particle species
+per event): the previous implementation, one boolean mask over the particle
+array per PDG id plus one concatenation per composite collection, versus the
+current single grouping pass, without and with building every composite
+collection (they are built on first access).
+
+    python benchmarks/lheparse_build.py --nevents 20000 --nparticles 40
+'''
+
+import argparse
+import time
+
+import awkward as ak
+import numpy as np
+
+from heptools.LHEparse import LHEparse
+
+
+def make_array(nevents, nparticles, seed=1):
+
+    """ Events of pylhe.to_awkward layout with about nparticles particles of random PDGID species """
+
+    rng     = np.random.default_rng(seed)
+    counts  = rng.integers(nparticles // 2, 3 * nparticles // 2, size=nevents)
+    ids     = rng.choice(np.array(list(LHEparse.PDGID), dtype=np.float64), size=counts.sum())
+    momenta = rng.normal(0., 100., size=(4, counts.sum()))
+    particles = ak.zip({"id": ids, "status": np.ones_like(ids),
+                        "px": momenta[0], "py": momenta[1], "pz": momenta[2], "e": np.abs(momenta[3])},
+                       with_name="Particle")
+    return ak.zip({"particles": ak.unflatten(particles, counts)}, depth_limit=1, with_name="Event")
+
+
+def masked_build(array):
+
+    """ LHEparse.build() before the single-pass grouping """
+
+    unique_keys    = np.unique(ak.flatten(array.particles.id).to_numpy())
+    PDGID_filtered = {k:v for k,v in LHEparse.PDGID.items() if k in unique_keys}
+
+    columns = {}
+    for k,v in PDGID_filtered.items():
+        columns[v] = array.particles[array.particles.id==k]
+    for name, members in LHEparse.COMPOSITES.items():
+        columns[name] = ak.concatenate([columns[member] for member in members], axis=1)
+
+    return ak.zip(columns, depth_limit=1, with_name="Event")
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nevents",    help = "Number of events", type = int, default = 20000)
+    parser.add_argument("--nparticles", help = "Mean number of particles per event", type = int, default = 40)
+    parser.add_argument("--repeat",     help = "Repetitions (best time is quoted)", type = int, default = 3)
+    args = parser.parse_args()
+
+    array = make_array(args.nevents, args.nparticles)
+    print(f"{'build':<12}{'time [s]':>10}")
+    def grouped_build_all(array):
+        events = LHEparse._build(array)
+        for name in LHEparse.COMPOSITES:
+            events[name]
+        return events
+
+    for name, build in (("masked", masked_build), ("grouped", LHEparse._build), ("+composites", grouped_build_all)):
+        times = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            events = build(array)
+            times.append(time.perf_counter() - t0)
+        print(f"{name:<12}{min(times):>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+'''
+Cost of the ttbar rest-frame boosts of the spin observables on synthetic
+events: the vector-library path (the four boostCM_of and to_beta3().unit()
+on awkward Momentum4D arrays, as awkward_spins.boost did) versus the fused
+kernel of heptools.ttbar_boosts (Numba-compiled if installed) into a
+preallocated output. Both paths are warmed up first, so the compile time is
+excluded. Events are processed in chunks of --chunk-size, which bounds the
+memory of the vector path.
+
+    python benchmarks/ttbar_boosts.py --nevents 1000000 10000000
+'''
+
+import argparse
+import time
+
+import awkward as ak
+import numpy as np
+import vector
+
+from heptools import ttbar_boosts
+from heptools.ttbar_boosts import parent_top_directions
+
+vector.register_awkward()
+
+
+def make_columns(nevents, seed=1):
+
+    """ (px, py, pz, E) columns of random tops, anti-tops and massless leptons """
+
+    rng = np.random.default_rng(seed)
+    columns = []
+    for mass in (172.5, 172.5, 0., 0.):
+        p = rng.normal(0., 200., size=(3, nevents))
+        columns.append((*p, np.sqrt((p**2).sum(axis=0) + mass**2)))
+    return columns
+
+
+def vector_boost(top, anti_top, leptonP, leptonM):
+
+    """ The boosts of awkward_spins.boost before the fused kernel """
+
+    ttbar = top + anti_top
+    top_in_CoM         = top.boostCM_of(ttbar)
+    antitop_in_CoM     = anti_top.boostCM_of(ttbar)
+    leptonP_in_top     = leptonP.boostCM_of(ttbar).boostCM_of(top_in_CoM)
+    leptonM_in_antitop = leptonM.boostCM_of(ttbar).boostCM_of(antitop_in_CoM)
+    return top_in_CoM.to_beta3().unit(), leptonP_in_top.to_beta3().unit(), leptonM_in_antitop.to_beta3().unit()
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nevents",    help = "Numbers of events", nargs='+', type = int, default = [1000000, 10000000])
+    parser.add_argument("--chunk-size", help = "Events per chunk", type = int, default = 1000000)
+    args = parser.parse_args()
+
+    warm = make_columns(10)
+    vector_boost(*[ak.zip({"x": p[0], "y": p[1], "z": p[2], "t": p[3]}, with_name="Momentum4D") for p in warm])
+    t0 = time.perf_counter()
+    parent_top_directions(*warm)
+    print(f"kernel: {'numba' if ttbar_boosts.numba is not None else 'numpy'}, first call (compile) {time.perf_counter() - t0:.2f} s")
+
+    print(f"{'events':>10}{'vector [s]':>12}{'kernel [s]':>12}{'speedup':>9}{'max |diff|':>12}")
+    for nevents in args.nevents:
+        times = {"vector": 0., "kernel": 0.}
+        diff  = 0.
+        out   = np.empty((3, 3, args.chunk_size))
+        for start in range(0, nevents, args.chunk_size):
+            columns = make_columns(min(args.chunk_size, nevents - start), seed=start)
+            arrays  = [ak.zip({"x": p[0], "y": p[1], "z": p[2], "t": p[3]}, with_name="Momentum4D") for p in columns]
+
+            t0 = time.perf_counter()
+            reference = vector_boost(*arrays)
+            times["vector"] += time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            directions = parent_top_directions(*columns, out=out[:, :, :len(columns[0][0])])
+            times["kernel"] += time.perf_counter() - t0
+
+            diff = max(diff, max(np.abs(directions[i, j] - ak.to_numpy(reference[i][axis])).max()
+                                 for i in range(3) for j, axis in enumerate("xyz")))
+            del reference, arrays
+        print(f"{nevents:>10}{times['vector']:>12.3f}{times['kernel']:>12.3f}{times['vector'] / times['kernel']:>9.1f}{diff:>12.1e}")
+
+
+if __name__ == '__main__':
+    main()
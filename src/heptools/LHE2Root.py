@@ -8,15 +8,24 @@ Changes:
 
 # Python modules
 import argparse
+import multiprocessing
+import os
 try:
     import xml.etree.cElementTree as ET
 except ImportError:
     import xml.etree.ElementTree as ET
 
-from ROOT import TTree, TFile, vector, gROOT, TLorentzVector, TVector3
+from ROOT import TTree, TFile, TChain, vector, gROOT, gInterpreter, addressof, TLorentzVector, TVector3
 from copy import copy
 import math
 import time
+import numpy as np
+
+from heptools.LHEcolumns import iter_event_columns, offsets_from_counts, event_ranges, weight_ids
+from heptools.LHEio import open_lhe, compression
+from heptools.root_branches import ScalarBranch, LEAF_TYPES, UNDEFINED, dense_column
+from heptools.LHEconfig import load_config, select_branches
+from heptools.LHEtiming import PhaseTimer, TimedReader, merge_summaries, write_summary
 
 from math import log, tan, acos, pi, copysign
 
@@ -37,6 +46,34 @@ parser.add_argument("--outtree",
                     nargs   = '?', 
                     type    = str, 
                     default = "test")
+parser.add_argument("--columnar",
+                    help    = "Parse events in chunks into flat arrays and fill the TTree from compiled code",
+                    action  = "store_true")
+parser.add_argument("--chunk-size",
+                    help    = "Number of events per chunk in columnar mode",
+                    nargs   = '?',
+                    type    = int,
+                    default = 10000)
+parser.add_argument("--jobs",
+                    help    = "Number of worker processes, each converting a contiguous range of events",
+                    nargs   = '?',
+                    type    = int,
+                    default = 1)
+parser.add_argument("--profile",
+                    help    = "Time the read, tokenize, kinematics, fill and write phases and write a JSON summary to this file",
+                    nargs   = '?',
+                    type    = str,
+                    default = None)
+parser.add_argument("--progress-interval",
+                    help    = "Minimum number of seconds between two progress lines",
+                    nargs   = '?',
+                    type    = float,
+                    default = 10.)
+parser.add_argument("--config",
+                    help    = "YAML or JSON file choosing the decay topology and the output branches",
+                    nargs   = '?',
+                    type    = str,
+                    default = None)
 # parser.add_argument("--cme",
 #                     help    = "Centre of mass energy in MEV, default is 13 TeV",
 #                     nargs   = '?',
@@ -47,8 +84,16 @@ args = parser.parse_args()
 
 include_decays = True
 
+# Timer of the events converted without instrumentation: phases are not timed
+_UNTIMED = PhaseTimer()
+
 
 class particle(object):
+
+    # Fixed attribute layout, no per-instance __dict__
+    __slots__ = ("index", "pid", "status", "mother1", "mother2", "color1", "color2",
+                 "px", "py", "pz", "e", "m", "f1", "spin")
+
     def __init__(self, index, pid, status, mother1, mother2, color1, color2, px, py, pz, e, mass, f1, spin):
         self.index    = index
         self.pid      = pid
@@ -65,29 +110,51 @@ class particle(object):
         self.f1       = f1
         self.spin     = spin
 
-        # Computed on the fly
-        self.p2      = self.px**2 + self.py**2 + self.pz**2
-        self.p       = self.p2 ** 0.5
-        self.pt      = (self.px**2 + self.py**2)**0.5
-        self.theta   = acos(self.pz / self.p)
+    # Computed on access, so only the quantities of the particles actually written are evaluated
+    @property
+    def p2(self):
+        return self.px**2 + self.py**2 + self.pz**2
+
+    @property
+    def p(self):
+        return self.p2 ** 0.5
+
+    @property
+    def pt(self):
+        return (self.px**2 + self.py**2)**0.5
+
+    @property
+    def theta(self):
+        return acos(self.pz / self.p)
+
+    @property
+    def phi(self):
         try:
-            self.phi = copysign( acos(self.px / self.pt), self.py )
+            return copysign( acos(self.px / self.pt), self.py )
         except ZeroDivisionError:
-            self.phi = 0.
+            return 0.
+
+    @property
+    def eta(self):
         try:
-            self.eta = -log(tan(self.theta / 2.))
+            return -log(tan(self.theta / 2.))
         except ValueError:
-            self.eta = copysign(9999.0, self.pz / self.p)
+            return copysign(9999.0, self.pz / self.p)
+
+    @property
+    def y(self):
         try:
-            self.y   = 0.5*log((self.e + self.pz)/(self.e - self.pz))
+            return 0.5*log((self.e + self.pz)/(self.e - self.pz))
         except (ZeroDivisionError, ValueError):
-            self.y   = 0
+            return 0
 
-        self.helicity = 0 #3 = left, -3 = right
+    @property
+    def helicity(self):
+        #3 = left, -3 = right
         if self.spin * self.pz > 0:
-            self.helicity = -3
+            return -3
         else:
-            self.helicity = 3
+            return 3
 
 def deltaR(a, b):
     deta = a.eta - b.eta
@@ -104,9 +171,9 @@ def ResetBranches(branches):
         branch.resize(0)
 
 
-def BookBranch(name, suffix, tree, branches):
+def BookBranch(name, suffix, tree, branches, scalar=False):
 
-    """ Function to book branches to an output TTree """
+    """ Function to book branches to an output TTree, as a scalar leaf if scalar else a vector """
 
     branch_type = 'null'
     if "F" in suffix:
@@ -116,12 +183,34 @@ def BookBranch(name, suffix, tree, branches):
     else:
         print("WARNING: Type not recognised",suffix)
 
-    branch = vector(branch_type)(20)
-    tree.Branch(name, branch)
+    if scalar:
+        branch = ScalarBranch(name, branch_type, tree)
+    else:
+        branch = vector(branch_type)(20)
+        tree.Branch(name, branch)
     branches[name]=branch
     return branch
 
 
+def BookWeightArray(name, nweights, tree):
+
+    """ Books a fixed-size float array branch name[nweights]/F and returns its buffer, holding UNDEFINED """
+
+    buffer = np.full(nweights, UNDEFINED, dtype=np.float32)
+    tree.Branch(name, buffer, f"{name}[{nweights}]/F")
+    return buffer
+
+
+def WriteWeightIds(ids, outfile):
+
+    """ Stores the reweighting ids, in the order of the rwgt array, once in the output file """
+
+    ids_vector = vector('string')()
+    for weight_id in ids:
+        ids_vector.push_back(weight_id)
+    outfile.WriteObject(ids_vector, "rwgt_ids")
+
+
 def cos_helicity(top, parent_top, ttbar, lepton, sign):
 
     """ Function to calculate the helicity angle
@@ -250,315 +339,325 @@ def cos_raxis(top, parent_t, ttbar, lep, sign):
         return theta
 
 
+def axis_sign(y, sign):
+
+    """ Sign flip of the transverse and r axes, as in cos_transverse and cos_raxis """
+
+    if y > 0:
+        return sign
+    if y < 0:
+        return -sign
+    return 1.
+
+
+def spin_analysing_cosines(top, tbar, ttbar, lep_p, lep_m):
+
+    """ All six cos_helicity, cos_transverse and cos_raxis values of an event
+    top, tbar, ttbar = the top, antitop and ttbar 4 vectors
+    lep_p, lep_m     = the 4 vectors of the positive and negative lepton
+
+    The vectors are boosted into the ttbar frame once, and each lepton into
+    the rest frame of its parent once, instead of once per angle. The inputs
+    are left untouched. Returns a dict of the cosp_* / cosm_* branch values.
+    """
+
+    boost_to_ttbar = ttbar.BoostVector()
+    boost_to_ttbar = boost_to_ttbar*-1.
+
+    top, tbar, lep_p, lep_m = copy(top), copy(tbar), copy(lep_p), copy(lep_m)
+    for vec in (top, tbar, lep_p, lep_m):
+        vec.Boost(boost_to_ttbar)
+
+    lep_p.Boost(top.BoostVector()*-1.)
+    lep_m.Boost(tbar.BoostVector()*-1.)
+
+    ###-- The axes are all built from the top direction in the ttbar frame
+    k_vector = top.Vect().Unit()
+    p_vector = TVector3(0,0,1)
+    y = p_vector.Dot(k_vector)
+    r = pow((1. - y*y),0.5)
+    n_vector = (1./r)*(p_vector.Cross(k_vector))
+    r_vector = (1./r)*(p_vector - y*k_vector)
+
+    cosines = {}
+    for name, lepton, sign in (("p", lep_p, +1), ("m", lep_m, -1)):
+        direction = lepton.Vect().Unit()
+        for basis, axis in (("hel", k_vector*sign), ("trans", n_vector*axis_sign(y, sign)), ("raxis", r_vector*axis_sign(y, sign))):
+            cos_theta = direction.Dot(axis)
+            cosines[f"cos{name}_{basis}"] = -55. if math.isnan(cos_theta) else cos_theta
+    return cosines
+
+
+
+# Quantities with at most one value per event, booked as Float_t / Int_t leaves
+# instead of vectors (holding UNDEFINED in events where they are not computed)
+SCALAR_BRANCHES = (
+    'weights',
+    'ttbar_pt', 'ttbar_eta', 'ttbar_phi', 'ttbar_e', 'ttbar_m', 'ttbar_y',
+    'onshell_top', 'onshell_tbar',
+    'cosp_hel', 'cosm_hel', 'cosp_raxis', 'cosm_raxis', 'cosp_trans', 'cosm_trans',
+    'dphi_ll',
+    'ttZ_pt', 'ttZ_eta', 'ttZ_phi', 'ttZ_e', 'ttZ_m', 'ttZ_y',
+    'tW_pt', 'tW_eta', 'tW_phi', 'tW_e', 'tW_m', 'tW_y',
+)
+
+# Branches of the first two (initial-state) particles of each event, and the quantity they hold
+INIT_QUANTITIES = (
+    ('init_pz',    'pz'),
+    ('init_pdgid', 'pdgid'),
+    ('init_hel',   'helicity'),
+    ('init_spin',  'spin'),
+)
+
+# Quantity ---> attribute of the particle class
+PARTICLE_ATTRIBUTES = {"pt": "pt", "eta": "eta", "phi": "phi", "e": "e", "m": "m", "y": "y",
+                       "pz": "pz", "pdgid": "pid", "spin": "spin", "helicity": "helicity"}
 
-def initialise_branches(outtree):
+SPIN_BRANCHES = ('cosp_hel', 'cosm_hel', 'cosp_trans', 'cosm_trans', 'cosp_raxis', 'cosm_raxis')
+
+SYSTEM_QUANTITIES = ('pt', 'eta', 'phi', 'e', 'm', 'y')
+
+
+class Topology(object):
 
     '''
-    Specified list of branches to be made on ROOT output TTree
-    Initialises each branch which is a ROOT vector
+    A decay topology the parser can convert
+        groups   = prefixes of the PARTICLE_GROUPS written for it
+        derived  = (branch name, type suffix) of the quantities its handlers compute
+        inputs   = particle-group branches read by the handlers, filled even if not written
+        legacy   = handler(branches) completing the branches of one event in push2ROOT
+        columnar = handler(columns, wanted) adding the derived columns of a block of
+                   events in columnar_branches; wanted is the set of branches to fill
+    '''
+
+    def __init__(self, name, groups, derived, inputs, legacy, columnar):
+        self.name     = name
+        self.groups   = tuple(groups)
+        self.derived  = tuple(derived)
+        self.inputs   = frozenset(inputs)
+        self.legacy   = legacy
+        self.columnar = columnar
+
+    def branch_names(self):
+
+        """ (name, type suffix) of every branch the topology can write, in booking order """
+
+        names = [(branch_name, '/F') for branch_name, _ in INIT_QUANTITIES] + [('weights', '/F'), ('reweight1', '/F')]
+        for prefix, _, quantities in PARTICLE_GROUPS:
+            if prefix in self.groups:
+                names += [(f"{prefix}_{q}", '/F') for q in quantities]
+        return names + list(self.derived)
+
+
+TOPOLOGIES = {}
+
+def register_topology(name, groups, derived, inputs, legacy, columnar):
+
+    """ Makes a decay topology available to the parsers under name, see Topology """
+
+    TOPOLOGIES[name] = Topology(name, groups, derived, inputs, legacy, columnar)
+    return TOPOLOGIES[name]
+
+
+def get_topology(config):
+
+    """ The registered Topology named by a configuration (see heptools.LHEconfig) """
+
+    if config["topology"] not in TOPOLOGIES:
+        raise ValueError(f"LHEparser: unknown topology {config['topology']}, registered: {sorted(TOPOLOGIES)}")
+    return TOPOLOGIES[config["topology"]]
+
+
+def selected_branches(config):
+
+    """ Names of the branches written for a configuration, rwgt included """
+
+    topology = get_topology(config)
+    return select_branches([name for name, _ in topology.branch_names()] + ['rwgt'], config["branches"])
+
+
+def initialise_branches(outtree, config=None, scratch=True):
+
+    '''
+    Branches to be made on ROOT output TTree, as selected by the configuration
+    (by default every branch of the ttbar topology)
+    Initialises each branch, a ROOT vector or for SCALAR_BRANCHES a scalar leaf
     Generates the branches dictionary stores all these branches
+    With scratch, the topology inputs which are not written are added to the
+    dictionary as vectors which are filled but not attached to the tree
     '''
-    branches = dict()
 
-    init_branches = [
-    'init_pz',
-    'init_pdgid',
-    'init_hel',
-    'init_spin'
-    ]
-    
-    weight_branches = ['weights','reweight1']
-
-    production_branches = [
-    'top_pt',
-    'top_eta',
-    'top_phi',
-    'top_e',
-    'top_m',
-    'top_y',
-    'tbar_pt',
-    'tbar_eta',
-    'tbar_phi',
-    'tbar_e',
-    'tbar_m',
-    'tbar_y',
-    'ttbar_pt',
-    'ttbar_eta',
-    'ttbar_phi',
-    'ttbar_e',
-    'ttbar_m',
-    'ttbar_y',
-    'G_pt',
-    'G_eta',
-    'G_phi',
-    'G_e',
-    'G_m',
-    'G_spin',
-    'onshell_top',
-    'onshell_tbar']
-
-    decay_branches = [
-    'cosp_hel',
-    'cosm_hel',
-    'cosp_raxis',
-    'cosm_raxis',
-    'cosp_trans',
-    'cosm_trans',
-    'b_pt',
-    'b_eta',
-    'b_phi',
-    'b_e',
-    'b_m',
-    'b_spin',
-    'bbar_pt',
-    'bbar_eta',
-    'bbar_phi',
-    'bbar_e',
-    'bbar_m',
-    'bbar_spin',
-    'Wp_pt',
-    'Wp_eta',
-    'Wp_phi',
-    'Wp_e',
-    'Wp_m',
-    'Wm_pt',
-    'Wm_eta',
-    'Wm_phi',
-    'Wm_e',
-    'Wm_m',
-    'lp_pt',
-    'lp_eta',
-    'lp_phi',
-    'lp_e',
-    'lp_m',
-    'lp_pdgid',
-    'lp_spin',
-    'lm_pt',
-    'lm_eta',
-    'lm_phi',
-    'lm_e',
-    'lm_m',
-    'lm_pdgid',
-    'lm_spin',
-    'dphi_ll',
-    'v_pt',
-    'v_eta',
-    'v_phi',
-    'v_e',
-    'v_m',
-    'v_pdgid',
-    'v_spin',
-    'vbar_pt',
-    'vbar_eta',
-    'vbar_phi',
-    'vbar_e',
-    'vbar_m',
-    'vbar_pdgid',
-    'vbar_spin']
-
-
-    for branch_name in init_branches:
-        BookBranch(branch_name,'/F', outtree, branches)
-
-    for branch_name in weight_branches:
-        BookBranch(branch_name,'/F', outtree, branches)
-
-    for branch_name in production_branches:
-        if branch_name == 'onshell_top' or branch_name == 'onshell_tbar':
-            BookBranch(branch_name,'/I', outtree, branches)
-        else:
-            BookBranch(branch_name,'/F', outtree, branches)
+    config   = load_config(config)
+    topology = get_topology(config)
+    selected = set(selected_branches(config))
 
-    for branch_name in decay_branches:
-        BookBranch(branch_name,'/F', outtree, branches)
+    branches = dict()
+    for branch_name, suffix in topology.branch_names():
+        if branch_name in selected:
+            BookBranch(branch_name, suffix, outtree, branches, scalar=branch_name in SCALAR_BRANCHES)
+        elif scratch and branch_name in topology.inputs:
+            branches[branch_name] = vector('int' if 'I' in suffix else 'float')(20)
 
     return branches
 
-def push2ROOT(outtree,particlelist,branches):
+
+def dispatch_table(topology, branches):
+
+    '''
+    PDG id ---> list of (branch, particle attribute) to push for a particle
+    of that id, for the particle groups of the topology present in branches
+    '''
+
+    table = {}
+    for prefix, pdgids, quantities in PARTICLE_GROUPS:
+        if prefix not in topology.groups:
+            continue
+        targets = [(branches[f"{prefix}_{q}"], PARTICLE_ATTRIBUTES[q]) for q in quantities if f"{prefix}_{q}" in branches]
+        for pdgid in pdgids:
+            table.setdefault(pdgid, []).extend(targets)
+    return table
+
+
+def Push(branches, name, value):
+
+    """ push_back on the branch name if it is booked """
+
+    branch = branches.get(name)
+    if branch is not None:
+        branch.push_back(value)
+
+
+def push2ROOT(outtree,particlelist,branches,topology=None,dispatch=None):
 
     '''
     LHE event particle ---> ROOT output
         --input: particlelist = a list of particles parsed from LHE file
-        Pushes all particle attributes to outtree branches
+        Pushes the particle attributes to the outtree branches through the
+        PDG-id dispatch table, then lets the topology handler add the
+        reconstructed quantities (ttbar by default)
     '''
 
-    # Particle assignment
-    hasTop=False
-    hasTbar=False
-    has_lp   = False
-    has_lm   = False
-
+    topology = topology or TOPOLOGIES["ttbar"]
+    dispatch = dispatch if dispatch is not None else dispatch_table(topology, branches)
+    init     = [(branches[branch_name], PARTICLE_ATTRIBUTES[q]) for branch_name, q in INIT_QUANTITIES if branch_name in branches]
 
     for counter, p in enumerate(particlelist):
         if counter < 2:
-            branches["init_pz"].push_back(p.pz)
-            branches["init_pdgid"].push_back(p.pid)
-            branches["init_hel"].push_back(p.helicity) 
-            branches["init_spin"].push_back(p.spin)               
-
-        if p.pid == 6:
-            branches["top_pt"].push_back(p.pt)
-            branches["top_eta"].push_back(p.eta)
-            branches["top_phi"].push_back(p.phi)
-            branches["top_e"].push_back(p.e)
-            branches["top_m"].push_back(p.m)
-            branches["top_y"].push_back(p.y)
-            hasTop = True
-        elif p.pid == -6:
-            branches["tbar_pt"].push_back(p.pt)
-            branches["tbar_eta"].push_back(p.eta)
-            branches["tbar_phi"].push_back(p.phi)
-            branches["tbar_e"].push_back(p.e)
-            branches["tbar_m"].push_back(p.m)
-            branches["tbar_y"].push_back(p.y)
-            hasTbar = True
-        elif p.pid == 5:
-            branches["b_pt"].push_back(p.pt)
-            branches["b_eta"].push_back(p.eta)
-            branches["b_phi"].push_back(p.phi)
-            branches["b_e"].push_back(p.e)
-            branches["b_m"].push_back(p.m)
-            branches["b_spin"].push_back(p.spin)                               
-        elif p.pid == -5:
-            branches["bbar_pt"].push_back(p.pt)
-            branches["bbar_eta"].push_back(p.eta)
-            branches["bbar_phi"].push_back(p.phi)
-            branches["bbar_e"].push_back(p.e)
-            branches["bbar_m"].push_back(p.m)
-            branches["bbar_spin"].push_back(p.spin)                                               
-        elif p.pid == 24:
-            branches["Wp_pt"].push_back(p.pt)
-            branches["Wp_eta"].push_back(p.eta)
-            branches["Wp_phi"].push_back(p.phi)
-            branches["Wp_e"].push_back(p.e)
-            branches["Wp_m"].push_back(p.m)
-        elif p.pid == -24:
-            branches["Wm_pt"].push_back(p.pt)
-            branches["Wm_eta"].push_back(p.eta)
-            branches["Wm_phi"].push_back(p.phi)
-            branches["Wm_e"].push_back(p.e)
-            branches["Wm_m"].push_back(p.m)
-        elif p.pid == 11 or p.pid == 13 or p.pid == 15:
-            branches["lm_pt"].push_back(p.pt)
-            branches["lm_eta"].push_back(p.eta)
-            branches["lm_phi"].push_back(p.phi)
-            branches["lm_e"].push_back(p.e)
-            branches["lm_m"].push_back(p.m)
-            branches["lm_pdgid"].push_back(p.pid)
-            branches["lm_spin"].push_back(p.spin)   
-            has_lm = True                                                            
-        elif p.pid == -11 or p.pid == -13 or p.pid == -15:
-            branches["lp_pt"].push_back(p.pt)
-            branches["lp_eta"].push_back(p.eta)
-            branches["lp_phi"].push_back(p.phi)
-            branches["lp_e"].push_back(p.e)
-            branches["lp_m"].push_back(p.m)
-            branches["lp_pdgid"].push_back(p.pid)
-            branches["lp_spin"].push_back(p.spin)  
-            has_lp = True                                                             
-        elif p.pid == 12 or p.pid == 14 or p.pid == 16:
-            branches["v_pt"].push_back(p.pt)
-            branches["v_eta"].push_back(p.eta)
-            branches["v_phi"].push_back(p.phi)
-            branches["v_e"].push_back(p.e)
-            branches["v_m"].push_back(p.m)
-            branches["v_pdgid"].push_back(p.pid)
-            branches["v_spin"].push_back(p.spin)                                                               
-        elif p.pid == -12 or p.pid == -14 or p.pid == -16:
-            branches["vbar_pt"].push_back(p.pt)
-            branches["vbar_eta"].push_back(p.eta)
-            branches["vbar_phi"].push_back(p.phi)
-            branches["vbar_e"].push_back(p.e)
-            branches["vbar_m"].push_back(p.m)
-            branches["vbar_pdgid"].push_back(p.pid)
-            branches["vbar_spin"].push_back(p.spin)                                                               
-        elif abs(p.pid) == 21:
-            branches["G_pt"].push_back(p.pt)
-            branches["G_eta"].push_back(p.eta)
-            branches["G_phi"].push_back(p.phi)
-            branches["G_e"].push_back(p.e)
-            branches["G_m"].push_back(p.m)
-            branches["G_spin"].push_back(p.spin)                                                               
-        #else:
-            #print("LHEparser: WARNING - Particle",p.pid,"wasn't assigned to anything!")
-
-    ###-- Do ttbar --###
-    top   = TLorentzVector()
-    tbar  = TLorentzVector()
-    if hasTop:
-        top.SetPtEtaPhiM(branches["top_pt"][0],  branches["top_eta"][0],  branches["top_phi"][0],  branches["top_m"][0])
-        branches["onshell_top"].push_back(1)
-    else:
-        _lepton   = TLorentzVector()
-        _neutrino = TLorentzVector()
-        _bottom   = TLorentzVector()
-        _lepton.SetPtEtaPhiM(   branches["lp_pt"][0], branches["lp_eta"][0], branches["lp_phi"][0], branches["lp_m"][0])
-        _neutrino.SetPtEtaPhiM( branches["v_pt"][0],  branches["v_eta"][0],  branches["v_phi"][0],  branches["v_m"][0])
-        _bottom.SetPtEtaPhiM(   branches["b_pt"][0],  branches["b_eta"][0],  branches["b_phi"][0],  branches["b_m"][0])
-        top = _lepton + _neutrino + _bottom
-        branches["onshell_top"].push_back(0)
-        branches["top_pt"].push_back(top.Pt())
-        branches["top_eta"].push_back(top.Eta())
-        branches["top_phi"].push_back(top.Phi())
-        branches["top_e"].push_back(top.E())
-        branches["top_m"].push_back(top.M())
-        branches["top_y"].push_back(top.Y())
-
-    if hasTbar:
-        tbar.SetPtEtaPhiM(branches["tbar_pt"][0], branches["tbar_eta"][0], branches["tbar_phi"][0], branches["tbar_m"][0])
-        branches["onshell_tbar"].push_back(1)
-    else:
-        _lepton   = TLorentzVector()
-        _neutrino = TLorentzVector()
-        _bottom   = TLorentzVector()
-        _lepton.SetPtEtaPhiM(   branches["lm_pt"][0],   branches["lm_eta"][0],   branches["lm_phi"][0],   branches["lm_m"][0])
-        _neutrino.SetPtEtaPhiM( branches["vbar_pt"][0], branches["vbar_eta"][0], branches["vbar_phi"][0], branches["vbar_m"][0])
-        _bottom.SetPtEtaPhiM(   branches["bbar_pt"][0], branches["bbar_eta"][0], branches["bbar_phi"][0], branches["bbar_m"][0])
-        tbar = _lepton + _neutrino + _bottom
-        branches["onshell_tbar"].push_back(0)
-        branches["tbar_pt"].push_back(tbar.Pt())
-        branches["tbar_eta"].push_back(tbar.Eta())
-        branches["tbar_phi"].push_back(tbar.Phi())
-        branches["tbar_e"].push_back(tbar.E())
-        branches["tbar_m"].push_back(tbar.M())
-        branches["tbar_y"].push_back(tbar.Y())
-    ttbar = top + tbar
+            for branch, attribute in init:
+                branch.push_back(getattr(p, attribute))
+
+        for branch, attribute in dispatch.get(p.pid, ()):
+            branch.push_back(getattr(p, attribute))
 
-    branches["ttbar_pt"].push_back(ttbar.Pt())
-    branches["ttbar_eta"].push_back(ttbar.Eta())
-    branches["ttbar_phi"].push_back(ttbar.Phi())
-    branches["ttbar_e"].push_back(ttbar.E())
-    branches["ttbar_m"].push_back(ttbar.M())
-    branches["ttbar_y"].push_back(ttbar.Rapidity())
-
-    if include_decays:
-
-        if has_lp and has_lm:
-            lep_p = TLorentzVector()
-            lep_m = TLorentzVector()        
-
-            lep_p.SetPtEtaPhiM(branches["lp_pt"][0],  branches["lp_eta"][0],  branches["lp_phi"][0],  branches["lp_m"][0])
-            lep_m.SetPtEtaPhiM(branches["lm_pt"][0],  branches["lm_eta"][0],  branches["lm_phi"][0],  branches["lm_m"][0])   
-
-            branches["dphi_ll"].push_back(lep_p.DeltaPhi(lep_m))
-
-            cos_hel_p   = cos_helicity(  copy(top), copy(top),  copy(ttbar), copy(lep_p), +1)
-            cos_hel_m   = cos_helicity(  copy(top), copy(tbar), copy(ttbar), copy(lep_m), -1)        
-            cos_trans_p = cos_transverse(copy(top), copy(top),  copy(ttbar), copy(lep_p), +1)
-            cos_trans_m = cos_transverse(copy(top), copy(tbar), copy(ttbar), copy(lep_m), -1) 
-            cos_raxis_p = cos_raxis(     copy(top), copy(top),  copy(ttbar), copy(lep_p), +1)
-            cos_raxis_m = cos_raxis(     copy(top), copy(tbar), copy(ttbar), copy(lep_m), -1) 
-        
-            branches["cosp_hel"].push_back(cos_hel_p)
-            branches["cosm_hel"].push_back(cos_hel_m)
-            branches["cosp_raxis"].push_back(cos_raxis_p)
-            branches["cosm_raxis"].push_back(cos_raxis_m)
-            branches["cosp_trans"].push_back(cos_trans_p)
-            branches["cosm_trans"].push_back(cos_trans_m)
+    topology.legacy(branches)
 
     # outtree.Fill()
-    
-def parse_event(elem,branches,outtree):
+
+
+###--- Topology handlers, legacy (per event) ---###
+
+def _vector_from_branches(branches, prefix):
+    vec = TLorentzVector()
+    vec.SetPtEtaPhiM(branches[f"{prefix}_pt"][0], branches[f"{prefix}_eta"][0], branches[f"{prefix}_phi"][0], branches[f"{prefix}_m"][0])
+    return vec
+
+
+def _push_system(branches, prefix, vec):
+    for q, value in zip(SYSTEM_QUANTITIES, (vec.Pt(), vec.Eta(), vec.Phi(), vec.E(), vec.M(), vec.Rapidity())):
+        Push(branches, f"{prefix}_{q}", value)
+
+
+def reconstruct_parent(branches, name, lepton, neutrino, bottom):
+
+    '''
+    The top (name = "top") or antitop ("tbar") 4 vector of an event: the
+    on-shell particle if present, otherwise the sum of its decay products,
+    whose kinematics are then pushed to the name_* branches. None if neither
+    is in the event
+    '''
+
+    if len(branches[f"{name}_pt"]) > 0:
+        Push(branches, f"onshell_{name}", 1)
+        return _vector_from_branches(branches, name)
+
+    if any(len(branches[f"{prefix}_pt"]) == 0 for prefix in (lepton, neutrino, bottom)):
+        return None
+
+    parent = _vector_from_branches(branches, lepton) + _vector_from_branches(branches, neutrino) + _vector_from_branches(branches, bottom)
+    Push(branches, f"onshell_{name}", 0)
+    # NB: TLorentzVector::Y() is the y-component of the momentum, not the rapidity
+    for q, value in zip(SYSTEM_QUANTITIES, (parent.Pt(), parent.Eta(), parent.Phi(), parent.E(), parent.M(), parent.Y())):
+        Push(branches, f"{name}_{q}", value)
+    return parent
+
+
+def ttbar_system(branches):
+
+    """ Top, antitop and ttbar 4 vectors of an event, pushing the ttbar_* branches """
+
+    top  = reconstruct_parent(branches, "top",  "lp", "v",    "b")
+    tbar = reconstruct_parent(branches, "tbar", "lm", "vbar", "bbar")
+    if top is None or tbar is None:
+        raise IndexError("LHEparser: event is missing a particle required to build the ttbar system")
+
+    ttbar = top + tbar
+    _push_system(branches, "ttbar", ttbar)
+    return top, tbar, ttbar
+
+
+def ttbar_handler(branches):
+
+    """ Top, antitop, ttbar and, for dileptonic events, the lepton angles; returns the ttbar 4 vector """
+
+    top, tbar, ttbar = ttbar_system(branches)
+
+    if include_decays and len(branches["lp_pt"]) > 0 and len(branches["lm_pt"]) > 0:
+
+        lep_p = _vector_from_branches(branches, "lp")
+        lep_m = _vector_from_branches(branches, "lm")
+
+        Push(branches, "dphi_ll", lep_p.DeltaPhi(lep_m))
+
+        if any(branch_name in branches for branch_name in SPIN_BRANCHES):
+            for branch_name, cos_theta in spin_analysing_cosines(top, tbar, ttbar, lep_p, lep_m).items():
+                Push(branches, branch_name, cos_theta)
+
+    return ttbar
+
+
+def ttZ_handler(branches):
+
+    """ The ttbar quantities plus the ttZ system, for events with a Z """
+
+    ttbar = ttbar_handler(branches)
+    if len(branches["Z_pt"]) > 0:
+        _push_system(branches, "ttZ", ttbar + _vector_from_branches(branches, "Z"))
+
+
+def single_top_handler(branches):
+
+    """ Whichever of the top and antitop is in the event, on-shell or rebuilt from its decay """
+
+    reconstruct_parent(branches, "top",  "lp", "v",    "b")
+    reconstruct_parent(branches, "tbar", "lm", "vbar", "bbar")
+
+
+def tW_handler(branches):
+
+    """ The single top quantities plus the system of the top and the W produced with it """
+
+    top  = reconstruct_parent(branches, "top",  "lp", "v",    "b")
+    tbar = reconstruct_parent(branches, "tbar", "lm", "vbar", "bbar")
+    if (top is None) == (tbar is None):
+        return
+
+    # The W produced with the top has the opposite charge to the one from its decay
+    parent, W = (top, "Wm") if top is not None else (tbar, "Wp")
+    if len(branches[f"{W}_pt"]) > 0:
+        _push_system(branches, "tW", parent + _vector_from_branches(branches, W))
+
+
+def parse_event(elem,branches,outtree,topology=None,dispatch=None,timer=None):
 
     '''
     The actual parsing...
@@ -581,7 +680,7 @@ def parse_event(elem,branches,outtree):
     aqcd            = event_data[5]
 
     nominal_weight = float(LHEparticlelist[0].split()[2])
-    branches["weights"].push_back(nominal_weight)
+    Push(branches, "weights", nominal_weight)
 
     LHEparticlelist.pop(0)
 
@@ -617,20 +716,73 @@ def parse_event(elem,branches,outtree):
 
         particlelist.append( particle(iLHEp, *LHEp) )
 
+    timer = timer or _UNTIMED
+
     ### Call the push2ROOT function which will write each particle's parameters to the outtree
-    push2ROOT(outtree,particlelist,branches)
+    with timer.phase("kinematics"):
+        push2ROOT(outtree,particlelist,branches,topology,dispatch)
 
     # Fill the TTree with this event's particles and weight
-    outtree.Fill()
+    with timer.phase("fill"):
+        outtree.Fill()
 
 
-def parser(infile,outfile,outtree):
+def iterparse_range(infile, start, stop, block_size=1<<20, timer=None):
+
+    '''
+    Equivalent of ET.iterparse over the bytes [start, stop) of infile, which
+    must cover whole <event> blocks. The range is streamed in blocks of
+    block_size bytes, so memory use does not grow with the range.
+    '''
+
+    pull_parser = ET.XMLPullParser(events=("end",))
+    pull_parser.feed(b"<LesHouchesEvents>")
 
+    with open(infile, "rb") as f:
+        f.seek(start)
+        f = TimedReader(f, timer) if timer is not None else f
+        remaining = stop - start
+        while remaining > 0:
+            data = f.read(min(block_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            pull_parser.feed(data)
+            yield from pull_parser.read_events()
+
+    pull_parser.feed(b"</LesHouchesEvents>")
+    yield from pull_parser.read_events()
+
+
+def iterparse_lhe(infile, byte_range=None, timer=None):
+
+    '''
+    ET.iterparse over a plain or compressed LHE file, or over a byte range of
+    an uncompressed one; the reads are charged to timer if given
+    '''
+
+    if byte_range is not None:
+        yield from iterparse_range(infile, *byte_range, timer=timer)
+        return
+
+    with open_lhe(infile) as source:
+        yield from ET.iterparse(TimedReader(source, timer) if timer is not None else source)
+
+
+def parser(infile,outfile,outtree,byte_range=None,config=None,profile=None,progress_interval=10.,timer=None):
+
+    '''
+    LHE ---> ROOT conversion through XML parsing
+        profile           = JSON file for the per-phase timing summary, see heptools.LHEtiming
+        progress_interval = minimum number of seconds between two progress lines
+        timer             = PhaseTimer to report to, instead of one made from the two above
+        Returns the timing summary
+    '''
 
     print("LHEparser: Welcome to the LHE Parser, attempting to parse input file")
     print("LHEparser: (this may take a while if you have a lot of events)")   
 
-    t0 = time.time()
+    timer = timer or PhaseTimer(enabled=profile is not None, interval=progress_interval)
 
     #Initialise output ROOT file
     gROOT.cd()
@@ -639,31 +791,626 @@ def parser(infile,outfile,outtree):
     gROOT.cd()
 
     # Initialise branches
-    branches=initialise_branches(outtree)
+    config   = load_config(config)
+    topology = get_topology(config)
+    branches = initialise_branches(outtree, config)
+    dispatch = dispatch_table(topology, branches)
+    rwgt_ids = weight_ids(infile) if "rwgt" in selected_branches(config) else []
+    rwgt     = BookWeightArray("rwgt", len(rwgt_ids), outtree) if rwgt_ids else None
 
     ### Parse the XML 
-    assert not ".lhe.gz" in infile, "You need to un-tar the input file first"
-
-    counter =0 
-    for (index, elem) in ET.iterparse(infile):
+    for (index, elem) in timer.timed_iter(iterparse_lhe(infile, byte_range, timer), "tokenize"):
 
-        ResetBranches(branches)
+        if elem.tag == "rwgt" and rwgt is not None:
+            rwgt[:] = [float(wgt.text) for wgt in elem]
         if elem.tag == "event":
-            counter += 1
-            if counter % 1000 == 0: print("LHEparser: Event number ",str(counter))
-            parse_event(elem,branches,outtree)
+            ResetBranches(branches)
+            with timer.phase("tokenize"):
+                parse_event(elem,branches,outtree,topology,dispatch,timer)
+            timer.count(events=1)
+            # An event without <rwgt> is written with UNDEFINED weights, not the previous event's
+            if rwgt is not None:
+                rwgt[:] = UNDEFINED
+
+        # <wgt> values are read once their <rwgt> block is complete
+        if elem.tag != "wgt":
+            elem.clear()
+
+    with timer.phase("write"):
+        if rwgt_ids:
+            WriteWeightIds(rwgt_ids, outfile)
+        outfile.Write()
+        outfile.Close()
+
+    return timer.report(profile)
+
+
+
+###--- Columnar mode ---###
+
+# (branch prefix, PDG ids, particle quantities) of the particle groups: the PDG-id dispatch
+# table of push2ROOT and the selections of columnar_branches. Topologies list the groups they write
+PARTICLE_GROUPS = [
+    ("top",  (6,),              ("pt", "eta", "phi", "e", "m", "y")),
+    ("tbar", (-6,),             ("pt", "eta", "phi", "e", "m", "y")),
+    ("b",    (5,),              ("pt", "eta", "phi", "e", "m", "spin")),
+    ("bbar", (-5,),             ("pt", "eta", "phi", "e", "m", "spin")),
+    ("Wp",   (24,),             ("pt", "eta", "phi", "e", "m")),
+    ("Wm",   (-24,),            ("pt", "eta", "phi", "e", "m")),
+    ("lm",   (11, 13, 15),      ("pt", "eta", "phi", "e", "m", "pdgid", "spin")),
+    ("lp",   (-11, -13, -15),   ("pt", "eta", "phi", "e", "m", "pdgid", "spin")),
+    ("v",    (12, 14, 16),      ("pt", "eta", "phi", "e", "m", "pdgid", "spin")),
+    ("vbar", (-12, -14, -16),   ("pt", "eta", "phi", "e", "m", "pdgid", "spin")),
+    ("G",    (21, -21),         ("pt", "eta", "phi", "e", "m", "spin")),
+    ("Z",    (23,),             ("pt", "eta", "phi", "e", "m")),
+]
+
+# Basket size (bytes) for the columnar output branches
+BASKET_SIZE = 512000
+
+# Compiled event loop which copies each event's slice of the flat columns into the
+# branch vectors and fills the tree. Each slot is a (vector, content, offsets) address triplet,
+# each array slot a (buffer, content, width) triplet for a scalar or fixed-size array branch
+_COLUMNAR_FILLER = """
+#include <algorithm>
+#include <vector>
+#include "TTree.h"
+
+namespace heptools {
+
+template <typename T>
+void assign_slots(const std::vector<ULong64_t> &slots, Long64_t entry)
+{
+    for (std::size_t i = 0; i < slots.size(); i += 3) {
+        auto buffer  = reinterpret_cast<std::vector<T> *>(slots[i]);
+        auto content = reinterpret_cast<const T *>(slots[i + 1]);
+        auto offsets = reinterpret_cast<const Long64_t *>(slots[i + 2]);
+        buffer->assign(content + offsets[entry], content + offsets[entry + 1]);
+    }
+}
+
+template <typename T>
+void assign_array_slots(const std::vector<ULong64_t> &slots, Long64_t entry)
+{
+    for (std::size_t i = 0; i < slots.size(); i += 3) {
+        auto buffer  = reinterpret_cast<T *>(slots[i]);
+        auto content = reinterpret_cast<const T *>(slots[i + 1]);
+        auto width   = static_cast<Long64_t>(slots[i + 2]);
+        std::copy(content + entry * width, content + (entry + 1) * width, buffer);
+    }
+}
+
+Long64_t fill_columnar(TTree *tree, Long64_t nentries,
+                       const std::vector<ULong64_t> &float_slots,
+                       const std::vector<ULong64_t> &int_slots,
+                       const std::vector<ULong64_t> &float_array_slots,
+                       const std::vector<ULong64_t> &int_array_slots)
+{
+    for (Long64_t entry = 0; entry < nentries; ++entry) {
+        assign_slots<float>(float_slots, entry);
+        assign_slots<int>(int_slots, entry);
+        assign_array_slots<float>(float_array_slots, entry);
+        assign_array_slots<int>(int_array_slots, entry);
+        tree->Fill();
+    }
+    return nentries;
+}
+
+}
+"""
+_columnar_filler_declared = False
+
+
+def particle_kinematics(events):
+
+    '''
+    Vectorised equivalent of the kinematics computed by the particle class,
+    evaluated for every particle of an EventColumns block at once
+    '''
+
+    px, py, pz, e, spin = (events[field] for field in ("px", "py", "pz", "e", "spin"))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p        = (px**2 + py**2 + pz**2) ** 0.5
+        pt       = (px**2 + py**2) ** 0.5
+        theta    = np.arccos(pz / p)
+        phi      = np.where(pt > 0, np.copysign(np.arccos(px / pt), py), 0.)
+        tan_half = np.tan(theta / 2.)
+        eta      = np.where(tan_half > 0, -np.log(tan_half), np.copysign(9999.0, pz / p))
+        y        = 0.5*np.log((e + pz)/(e - pz))
+
+    return {"pt"       : pt,
+            "eta"      : eta,
+            "phi"      : phi,
+            "e"        : e,
+            "m"        : events["m"],
+            "y"        : np.where(np.isfinite(y), y, 0.),
+            "pz"       : pz,
+            "pdgid"    : events["id"],
+            "spin"     : spin,
+            "helicity" : np.where(spin * pz > 0, -3, 3)}
+
+
+def _set_pt_eta_phi_m(pt, eta, phi, m):
+
+    """ TLorentzVector::SetPtEtaPhiM on arrays, returns rows (px, py, pz, E) """
+
+    pt = np.abs(pt)
+    px, py, pz = pt*np.cos(phi), pt*np.sin(phi), pt*np.sinh(eta)
+    p2 = px*px + py*py + pz*pz
+    e  = np.where(m >= 0, np.sqrt(p2 + m*m), np.sqrt(np.maximum(p2 - m*m, 0.)))
+    return np.array([px, py, pz, e])
+
+
+def _pt(v):
+    return np.sqrt(v[0]*v[0] + v[1]*v[1])
+
+def _eta(v):
+    cos_theta = v[2] / np.sqrt(v[0]*v[0] + v[1]*v[1] + v[2]*v[2])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        eta = -0.5*np.log((1.0 - cos_theta)/(1.0 + cos_theta))
+    return np.where(cos_theta*cos_theta < 1, eta, np.copysign(10e10, v[2]) * (v[2] != 0))
+
+def _phi(v):
+    return np.where((v[0] == 0) & (v[1] == 0), 0., np.arctan2(v[1], v[0]))
+
+def _mass(v):
+    mm = v[3]*v[3] - (v[0]*v[0] + v[1]*v[1] + v[2]*v[2])
+    return np.where(mm < 0, -np.sqrt(np.abs(mm)), np.sqrt(np.abs(mm)))
+
+def _rapidity(v):
+    return 0.5*np.log((v[3] + v[2])/(v[3] - v[2]))
+
+def _delta_phi(a, b):
+    x = _phi(a) - _phi(b)
+    return np.where((x >= -pi) & (x < pi), x, np.mod(x + pi, 2*pi) - pi)
+
+
+def _boost_vector(v):
+    return v[:3] / v[3]
+
+def _boost(v, b):
+
+    """ TLorentzVector::Boost on arrays, returns a boosted copy of v """
+
+    b2     = b[0]*b[0] + b[1]*b[1] + b[2]*b[2]
+    gamma  = 1.0 / np.sqrt(1.0 - b2)
+    bp     = b[0]*v[0] + b[1]*v[1] + b[2]*v[2]
+    gamma2 = np.where(b2 > 0, (gamma - 1.0)/np.where(b2 > 0, b2, 1.0), 0.0)
+    return np.array([v[0] + gamma2*bp*b[0] + gamma*b[0]*v[3],
+                     v[1] + gamma2*bp*b[1] + gamma*b[1]*v[3],
+                     v[2] + gamma2*bp*b[2] + gamma*b[2]*v[3],
+                     gamma*(v[3] + bp)])
+
+def _unit(v3):
+    tot2 = v3[0]*v3[0] + v3[1]*v3[1] + v3[2]*v3[2]
+    return v3 * np.where(tot2 > 0, 1.0/np.sqrt(np.where(tot2 > 0, tot2, 1.0)), 1.0)
+
+def _dot(a, b):
+    return a[0]*b[0] + a[1]*b[1] + a[2]*b[2]
+
+def _cross(a, b):
+    return np.array([a[1]*b[2] - b[1]*a[2],
+                     a[2]*b[0] - b[2]*a[0],
+                     a[0]*b[1] - b[0]*a[1]])
+
+
+def _axis_sign(y, sign):
+    return np.where(y > 0, sign, np.where(y < 0, -sign, 1.))
+
+
+def columnar_spin_cosines(top, tbar, ttbar, lep_p, lep_m):
+
+    """
+    Array version of spin_analysing_cosines, the inputs are (4, N) arrays of
+    (px, py, pz, E). Each boost is done once for all events, and the
+    helicity, transverse and r-axis cosines of both leptons are projections
+    of the shared lepton directions on the shared axes
+    """
+
+    boost_to_ttbar = _boost_vector(ttbar) * -1.
+    top, tbar, lep_p, lep_m = (_boost(vec, boost_to_ttbar) for vec in (top, tbar, lep_p, lep_m))
+    lep_p = _boost(lep_p, _boost_vector(top) * -1.)
+    lep_m = _boost(lep_m, _boost_vector(tbar) * -1.)
+
+    k_vector = _unit(top[:3])
+    p_vector = np.array([0., 0., 1.])[:, None]
+    y        = k_vector[2]
+    cosines  = {}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r        = (1. - y*y) ** 0.5
+        n_vector = (1./r) * _cross(p_vector, k_vector)
+        r_vector = (1./r) * (p_vector - y*k_vector)
+        for name, lepton, sign in (("p", lep_p, +1), ("m", lep_m, -1)):
+            direction = _unit(lepton[:3])
+            for basis, axis in (("hel", k_vector * sign), ("trans", n_vector * _axis_sign(y, sign)), ("raxis", r_vector * _axis_sign(y, sign))):
+                cos_theta = _dot(direction, axis)
+                cosines[f"cos{name}_{basis}"] = np.where(np.isnan(cos_theta), -55., cos_theta)
+    return cosines
+
+
+def _first(column, mask):
+
+    """ First entry of a jagged (content, offsets) column for the events in mask """
+
+    content, offsets = column
+    if np.any(np.diff(offsets)[mask] == 0):
+        raise IndexError("LHEparser: event is missing a particle required to build the ttbar system")
+    # Read back through float, as push2ROOT does from its vector<float> branches
+    return content[offsets[:-1][mask]].astype(np.float64)
+
+
+def _append(column, values, mask):
+
+    """ Appends one value to the jagged column for each event in mask """
+
+    content, offsets = column
+    counts      = np.diff(offsets)
+    new_offsets = offsets_from_counts(counts + mask)
+    out         = np.empty(new_offsets[-1], dtype=content.dtype)
+
+    event = np.repeat(np.arange(len(counts)), counts)
+    out[new_offsets[:-1][event] + np.arange(len(content)) - offsets[:-1][event]] = content
+    out[new_offsets[1:][mask] - 1] = values
+    return out, new_offsets
+
+
+def _has(columns, prefix):
+    return np.diff(columns[f"{prefix}_pt"][1]) > 0
+
+
+def _columnar_vector(columns, prefix, mask):
+    return _set_pt_eta_phi_m(*(_first(columns[f"{prefix}_{q}"], mask) for q in ("pt", "eta", "phi", "m")))
+
+
+def _system_columns(columns, prefix, vec, mask):
+
+    """ Single-entry columns of the system vec, defined for the events in mask """
+
+    offsets = offsets_from_counts(mask.astype(np.int64))
+    for q, values in zip(SYSTEM_QUANTITIES, (_pt(vec), _eta(vec), _phi(vec), vec[3], _mass(vec), _rapidity(vec))):
+        columns[f"{prefix}_{q}"] = (values.astype(np.float32), offsets)
+
+
+def _reconstruct_parent(columns, name, lepton, neutrino, bottom, required=True):
+
+    '''
+    Four-vector of the top (or anti-top) for every event: the first on-shell
+    particle if present, otherwise the sum of its decay products, in which case
+    the reconstructed kinematics are appended to the particle branches.
+    Returns the (4, nevents) vectors and the mask of events where the parent
+    was found; unless required, events with neither are skipped instead of
+    raising
+    '''
 
-        elem.clear()
+    onshell = _has(columns, name)
+    nevents = len(onshell)
+    parent  = np.full((4, nevents), np.nan)
+    parent[:, onshell] = _columnar_vector(columns, name, onshell)
 
-    outfile.Write()
-    outfile.Close()
+    offshell = ~onshell
+    if not required:
+        offshell &= _has(columns, lepton) & _has(columns, neutrino) & _has(columns, bottom)
+    if offshell.any():
+        v = sum(_columnar_vector(columns, prefix, offshell) for prefix in (lepton, neutrino, bottom))
+        parent[:, offshell] = v
+        # NB: TLorentzVector::Y() is the y-component of the momentum, not the rapidity
+        for q, values in (("pt", _pt(v)), ("eta", _eta(v)), ("phi", _phi(v)), ("e", v[3]), ("m", _mass(v)), ("y", v[1])):
+            if f"{name}_{q}" in columns:
+                columns[f"{name}_{q}"] = _append(columns[f"{name}_{q}"], values, offshell)
 
-    print(time.time()-t0)
+    found = onshell | offshell
+    columns[f"onshell_{name}"] = (onshell[found].astype(np.int32), offsets_from_counts(found.astype(np.int64)))
+    return parent, found
+
+
+###--- Topology handlers, columnar (per block of events) ---###
+
+def columnar_ttbar_handler(columns, wanted):
+
+    """ Array version of ttbar_handler, returns the (4, nevents) ttbar vectors """
+
+    top, _  = _reconstruct_parent(columns, "top",  "lp", "v",    "b")
+    tbar, _ = _reconstruct_parent(columns, "tbar", "lm", "vbar", "bbar")
+    ttbar   = top + tbar
+    _system_columns(columns, "ttbar", ttbar, np.ones(ttbar.shape[1], dtype=bool))
+
+    has_leptons = _has(columns, "lp") & _has(columns, "lm") & include_decays
+    offsets     = offsets_from_counts(has_leptons.astype(np.int64))
+    lep_p = _columnar_vector(columns, "lp", has_leptons)
+    lep_m = _columnar_vector(columns, "lm", has_leptons)
+
+    columns["dphi_ll"] = (_delta_phi(lep_p, lep_m).astype(np.float32), offsets)
+    if any(branch_name in wanted for branch_name in SPIN_BRANCHES):
+        top, tbar, ttbar_ll = top[:, has_leptons], tbar[:, has_leptons], ttbar[:, has_leptons]
+        for branch_name, values in columnar_spin_cosines(top, tbar, ttbar_ll, lep_p, lep_m).items():
+            columns[branch_name] = (values.astype(np.float32), offsets)
+
+    return ttbar
+
+
+def columnar_ttZ_handler(columns, wanted):
+
+    """ Array version of ttZ_handler """
+
+    ttbar = columnar_ttbar_handler(columns, wanted)
+    has_Z = _has(columns, "Z")
+    _system_columns(columns, "ttZ", ttbar[:, has_Z] + _columnar_vector(columns, "Z", has_Z), has_Z)
+
+
+def columnar_single_top_handler(columns, wanted):
+
+    """ Array version of single_top_handler """
+
+    _reconstruct_parent(columns, "top",  "lp", "v",    "b",    required=False)
+    _reconstruct_parent(columns, "tbar", "lm", "vbar", "bbar", required=False)
+
+
+def columnar_tW_handler(columns, wanted):
+
+    """ Array version of tW_handler """
+
+    top,  has_top  = _reconstruct_parent(columns, "top",  "lp", "v",    "b",    required=False)
+    tbar, has_tbar = _reconstruct_parent(columns, "tbar", "lm", "vbar", "bbar", required=False)
+
+    # The W produced with the top has the opposite charge to the one from its decay
+    with_Wm = has_top & ~has_tbar & _has(columns, "Wm")
+    with_Wp = has_tbar & ~has_top & _has(columns, "Wp")
+    tW = np.full(top.shape, np.nan)
+    tW[:, with_Wm] = top[:, with_Wm]  + _columnar_vector(columns, "Wm", with_Wm)
+    tW[:, with_Wp] = tbar[:, with_Wp] + _columnar_vector(columns, "Wp", with_Wp)
+
+    found = with_Wm | with_Wp
+    _system_columns(columns, "tW", tW[:, found], found)
+
+
+def columnar_branches(events, topology=None, wanted=None):
+
+    '''
+    Columnar equivalent of parse_event + push2ROOT for a block of events
+        --input: events   = an EventColumns block
+                 topology = the decay Topology, ttbar by default
+                 wanted   = names of the branches to fill, all by default
+        Returns a dictionary of branch name ---> (content, offsets), where the
+        branch entries of event i are content[offsets[i]:offsets[i+1]]
+    '''
+
+    topology = topology or TOPOLOGIES["ttbar"]
+    wanted   = set(wanted) if wanted is not None else {name for name, _ in topology.branch_names()}
+    needed   = wanted | topology.inputs
+
+    nevents  = len(events)
+    single   = np.arange(nevents + 1)
+    kin      = particle_kinematics(events)
+    event    = events.event_index
+    pid      = events["id"]
+    columns  = {}
+
+    def select(mask, quantities, prefix):
+        counts  = np.bincount(event[mask], minlength=nevents)
+        offsets = offsets_from_counts(counts)
+        for q in quantities:
+            columns[f"{prefix}_{q}"] = (kin[q][mask].astype(np.float32), offsets)
+
+    # Initial-state partons are the first two particles of each event
+    initial = events.local_index < 2
+    counts  = np.bincount(event[initial], minlength=nevents)
+    for branch_name, q in INIT_QUANTITIES:
+        columns[branch_name] = (kin[q][initial].astype(np.float32), offsets_from_counts(counts))
+
+    columns["weights"]   = (events["weight"].astype(np.float32), single)
+    columns["reweight1"] = (np.zeros(0, dtype=np.float32), np.zeros(nevents + 1, dtype=np.int64))
+
+    for prefix, pdgids, quantities in PARTICLE_GROUPS:
+        quantities = [q for q in quantities if f"{prefix}_{q}" in needed]
+        if prefix in topology.groups and quantities:
+            select(np.isin(pid, pdgids), quantities, prefix)
+
+    topology.columnar(columns, wanted)
+
+    return columns
+
+
+def fill_columnar(outtree, branches, columns, weight_arrays={}):
+
+    '''
+    Fills outtree once per event from the flat columns, copying each event's
+    slice into the booked branch vectors (or the value of a scalar branch)
+    in a compiled loop
+    weight_arrays maps a fixed-size array branch name to its buffer (see
+    BookWeightArray) and (nevents, width) values
+    '''
+
+    global _columnar_filler_declared
+    if not _columnar_filler_declared:
+        gInterpreter.Declare(_COLUMNAR_FILLER)
+        _columnar_filler_declared = True
+
+    nevents = len(next(iter(columns.values()))[1]) - 1
+    fixed   = dict(weight_arrays)
+    slots   = {kind: vector('ULong64_t')() for kind in ("float", "int", "float_array", "int_array")}
+    arrays  = [] # keep the contiguous copies alive until the tree is filled
+    for name, branch in branches.items():
+        if isinstance(branch, ScalarBranch):
+            fixed[name] = (branch.buffer, dense_column(*columns[name], branch.buffer.dtype, branch.default)[:, None])
+            continue
+        branch_type = 'int' if 'int' in type(branch).__cpp_name__ else 'float'
+        content, offsets = columns[name]
+        content = np.ascontiguousarray(content, dtype=LEAF_TYPES[branch_type][1])
+        offsets = np.ascontiguousarray(offsets, dtype=np.int64)
+        arrays += [content, offsets]
+        for address in (addressof(branch), content.ctypes.data, offsets.ctypes.data):
+            slots[branch_type].push_back(address)
+    for buffer, values in fixed.values():
+        branch_type = 'int' if buffer.dtype == LEAF_TYPES['int'][1] else 'float'
+        values = np.ascontiguousarray(values, dtype=buffer.dtype)
+        arrays.append(values)
+        for address in (buffer.ctypes.data, values.ctypes.data, values.shape[1]):
+            slots[f"{branch_type}_array"].push_back(address)
+
+    from ROOT import heptools
+    return heptools.fill_columnar(outtree, nevents, slots["float"], slots["int"], slots["float_array"], slots["int_array"])
+
+
+def columnar_parser(infile,outfile,outtree,chunk_size=10000,byte_range=None,config=None,profile=None,progress_interval=10.,timer=None):
+
+    '''
+    Columnar LHE ---> ROOT conversion
+        Event blocks are read in chunks of chunk_size, converted in bulk to
+        flat arrays, and written with the same branches as parser(); profile,
+        progress_interval and timer as for parser()
+        Returns the timing summary
+    '''
+
+    print("LHEparser: Welcome to the LHE Parser, attempting to parse input file (columnar mode)")
+
+    timer = timer or PhaseTimer(enabled=profile is not None, interval=progress_interval)
+
+    #Initialise output ROOT file
+    gROOT.cd()
+    outfile = TFile(outfile, "recreate")
+    outtree = TTree(outtree, outtree)
+    gROOT.cd()
+
+    # Initialise branches
+    config   = load_config(config)
+    topology = get_topology(config)
+    branches = initialise_branches(outtree, config, scratch=False)
+    rwgt_ids = weight_ids(infile) if "rwgt" in selected_branches(config) else []
+    rwgt     = BookWeightArray("rwgt", len(rwgt_ids), outtree) if rwgt_ids else None
+    outtree.SetBasketSize("*", BASKET_SIZE)
+
+    ### Read the event blocks straight from the raw bytes, without XML parsing
+    chunks = iter_event_columns(infile, chunk_size, byte_range, weights=bool(rwgt_ids), timer=timer)
+    for events in timer.timed_iter(chunks, "tokenize"):
+        if events.weights.shape[1] != len(rwgt_ids):
+            raise ValueError(f"LHEparser: events carry {events.weights.shape[1]} <wgt> weights but <initrwgt> declares {len(rwgt_ids)}")
+        weight_arrays = {"rwgt": (rwgt, events.weights)} if rwgt_ids else {}
+        with timer.phase("kinematics"):
+            columns = columnar_branches(events, topology, branches)
+        with timer.phase("fill"):
+            timer.count(events=fill_columnar(outtree, branches, columns, weight_arrays))
+
+    with timer.phase("write"):
+        if rwgt_ids:
+            WriteWeightIds(rwgt_ids, outfile)
+        outfile.Write()
+        outfile.Close()
+
+    return timer.report(profile)
+
+
+
+###--- Registered decay topologies ---###
+
+_PARENT_INPUTS = [f"{prefix}_{q}" for prefix in ("top", "tbar", "lp", "v", "b", "lm", "vbar", "bbar") for q in ("pt", "eta", "phi", "m")]
+_TOP_GROUPS    = ("top", "tbar", "b", "bbar", "Wp", "Wm", "lm", "lp", "v", "vbar")
+_ONSHELL       = [("onshell_top", '/I'), ("onshell_tbar", '/I')]
+
+def _system_branches(prefix):
+    return [(f"{prefix}_{q}", '/F') for q in SYSTEM_QUANTITIES]
+
+register_topology("ttbar",
+                  groups   = _TOP_GROUPS + ("G",),
+                  derived  = _ONSHELL + _system_branches("ttbar") + [("dphi_ll", '/F')] + [(name, '/F') for name in SPIN_BRANCHES],
+                  inputs   = _PARENT_INPUTS,
+                  legacy   = ttbar_handler,
+                  columnar = columnar_ttbar_handler)
+
+register_topology("ttZ",
+                  groups   = _TOP_GROUPS + ("G", "Z"),
+                  derived  = TOPOLOGIES["ttbar"].derived + tuple(_system_branches("ttZ")),
+                  inputs   = _PARENT_INPUTS + ["Z_pt", "Z_eta", "Z_phi", "Z_m"],
+                  legacy   = ttZ_handler,
+                  columnar = columnar_ttZ_handler)
+
+register_topology("single_top",
+                  groups   = _TOP_GROUPS,
+                  derived  = _ONSHELL,
+                  inputs   = _PARENT_INPUTS,
+                  legacy   = single_top_handler,
+                  columnar = columnar_single_top_handler)
+
+register_topology("tW",
+                  groups   = _TOP_GROUPS,
+                  derived  = _ONSHELL + _system_branches("tW"),
+                  inputs   = _PARENT_INPUTS + [f"{W}_{q}" for W in ("Wp", "Wm") for q in ("pt", "eta", "phi", "m")],
+                  legacy   = tW_handler,
+                  columnar = columnar_tW_handler)
+
+
+
+###--- Multi-process mode ---###
+
+def _convert_range(task):
+
+    """ Worker: converts one byte range of the input to its own partial ROOT file """
+
+    infile, partfile, outtree, byte_range, columnar, chunk_size, config, profiled, progress_interval = task
+    timer = PhaseTimer(enabled=profiled, interval=progress_interval)
+    if columnar:
+        summary = columnar_parser(infile, partfile, outtree, chunk_size=chunk_size, byte_range=byte_range, config=config, timer=timer)
+    else:
+        summary = parser(infile, partfile, outtree, byte_range=byte_range, config=config, timer=timer)
+    return partfile, summary
+
+
+def parallel_parser(infile,outfile,outtree,jobs,columnar=False,chunk_size=10000,config=None,profile=None,progress_interval=10.):
+
+    '''
+    Splits infile at <event> boundaries into one byte range per job, converts
+    the ranges in separate processes, and merges the partial trees into
+    outfile in the original event order
+    Returns the timing summaries of the processes merged, written to profile if given
+    '''
+
+    t0 = time.perf_counter()
+
+    assert compression(infile) is None, "LHEparser: splitting into jobs needs an uncompressed input file"
+    ranges = event_ranges(infile, jobs)
+    print(f"LHEparser: Converting {len(ranges)} ranges of {infile} with {jobs} processes")
+
+    config = load_config(config)
+    tasks  = [(infile, f"{outfile}.part{i}", outtree, byte_range, columnar, chunk_size, config, profile is not None, progress_interval)
+              for i, byte_range in enumerate(ranges)]
+    with multiprocessing.Pool(jobs) as pool:
+        partfiles, summaries = zip(*pool.map(_convert_range, tasks, chunksize=1))
+
+    # Partial trees are chained in range order, so the merged tree keeps the event order
+    chain = TChain(outtree)
+    for partfile in partfiles:
+        chain.Add(partfile)
+    chain.Merge(outfile, "fast")
+
+    # The weight ids are file metadata, not part of the chained trees
+    rwgt_ids = weight_ids(infile) if "rwgt" in selected_branches(config) else []
+    if rwgt_ids:
+        merged = TFile(outfile, "update")
+        WriteWeightIds(rwgt_ids, merged)
+        merged.Close()
+
+    for partfile in partfiles:
+        os.remove(partfile)
+
+    summary = merge_summaries(list(summaries), time.perf_counter()-t0)
+    print(f"LHEparser: {summary['events']} events in {summary['wall_time']:.2f} s "
+          f"({summary['events_per_s']:.0f} events/s, {summary['bytes_per_s']/1e6:.1f} MB/s)")
+    if profile is not None:
+        write_summary(summary, profile)
+    return summary
 
 
 def main():
 
-    parser(infile=args.infile,outfile=args.outfile,outtree=args.outtree)
+    if args.jobs > 1:
+        parallel_parser(infile=args.infile,outfile=args.outfile,outtree=args.outtree,jobs=args.jobs,columnar=args.columnar,chunk_size=args.chunk_size,config=args.config,
+                        profile=args.profile,progress_interval=args.progress_interval)
+    elif args.columnar:
+        columnar_parser(infile=args.infile,outfile=args.outfile,outtree=args.outtree,chunk_size=args.chunk_size,config=args.config,
+                        profile=args.profile,progress_interval=args.progress_interval)
+    else:
+        parser(infile=args.infile,outfile=args.outfile,outtree=args.outtree,config=args.config,
+               profile=args.profile,progress_interval=args.progress_interval)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,174 @@
+'''
+On-disk cache of parsed LHE events.
+
+Parsing the text of a large LHE file dominates the time of re-running an
+analysis on it. LHECache stores the awkward array built from a file in
+awkward's own buffer format (ak.to_buffers, saved as an uncompressed .npz),
+keyed by a hash of the file contents and a tag naming what was built, so it
+is reused as long as the file is unchanged and never served for a modified
+one. Hashes are remembered per (path, size, modification time), so a cache
+hit does not re-read the source file.
+
+The cache directory holds at most max_size bytes of entries; when a new
+entry takes it over the limit, the least recently used entries are removed.
+The directory and size default to the HEPTOOLS_CACHE_DIR and
+HEPTOOLS_CACHE_SIZE (in bytes) environment variables, else ~/.cache/heptools
+and 10 GB.
+'''
+
+import hashlib
+import json
+import os
+import tempfile
+
+import awkward as ak
+import numpy as np
+
+
+# Bumped whenever the layout of the cached arrays changes
+CACHE_VERSION  = 1
+
+DEFAULT_DIR    = os.path.join("~", ".cache", "heptools")
+DEFAULT_SIZE   = 10 * 1024**3
+
+
+def file_hash(file_name, block_size=1<<24):
+
+    """ BLAKE2b digest of the contents of file_name """
+
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_name, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class LHECache:
+
+    """
+    Args:
+    - cache_dir: directory of the cache entries, created if needed
+    - max_size: maximum total size of the entries in bytes
+    """
+
+    def __init__(self, cache_dir=None, max_size=None):
+        self.cache_dir = os.path.expanduser(cache_dir or os.environ.get("HEPTOOLS_CACHE_DIR", DEFAULT_DIR))
+        self.max_size  = int(max_size if max_size is not None else os.environ.get("HEPTOOLS_CACHE_SIZE", DEFAULT_SIZE))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._hashes   = os.path.join(self.cache_dir, "hashes.json")
+
+    def key(self, file_name, tag):
+
+        """ Name of the cache entry of tag built from file_name """
+
+        stat = os.stat(file_name)
+        path = os.path.abspath(file_name)
+        try:
+            with open(self._hashes) as f:
+                hashes = json.load(f)
+        except (OSError, ValueError):
+            hashes = {}
+        known = hashes.get(path)
+        if known is not None and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+            digest = known[2]
+        else:
+            digest = file_hash(file_name)
+            hashes[path] = [stat.st_size, stat.st_mtime_ns, digest]
+            self._replace(self._hashes, lambda f: f.write(json.dumps(hashes).encode()))
+        return f"{digest}-{tag}-v{CACHE_VERSION}.npz"
+
+    def load(self, file_name, tag):
+
+        """ Cached array of tag built from file_name, or None """
+
+        entry = os.path.join(self.cache_dir, self.key(file_name, tag))
+        try:
+            with np.load(entry) as data:
+                container = {name: data[name] for name in data.files if name not in ("form", "length")}
+                array = ak.from_buffers(str(data["form"]), int(data["length"]), container)
+        except (OSError, ValueError, KeyError):
+            return None
+        os.utime(entry)   # marks the entry as recently used
+        try:
+            import vector
+            vector.register_awkward()   # behaviour of the Momentum4D records
+        except ImportError:
+            pass
+        return array
+
+    def store(self, file_name, tag, array):
+
+        """ Caches array as tag built from file_name, then evicts entries over max_size """
+
+        form, length, container = ak.to_buffers(ak.to_packed(array))
+        entry = os.path.join(self.cache_dir, self.key(file_name, tag))
+        self._replace(entry, lambda f: np.savez(f, form=form.to_json(), length=length, **container))
+        self.evict(keep=entry)
+
+    def cached(self, file_name, tag, build):
+
+        """ Cached array of tag built from file_name, calling build() and caching its result on a miss """
+
+        array = self.load(file_name, tag)
+        if array is None:
+            array = build()
+            self.store(file_name, tag, array)
+        return array
+
+    def entries(self):
+
+        """ (path, size, last use) of the cache entries, least recently used first """
+
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".npz"):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((os.path.join(self.cache_dir, name), stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self, keep=None):
+
+        """ Removes the least recently used entries, except keep, until the cache fits in max_size """
+
+        entries = self.entries()
+        total   = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_size:
+                break
+            if path != keep:
+                os.remove(path)
+                total -= size
+
+    def clear(self):
+        for path, _, _ in self.entries():
+            os.remove(path)
+
+    def _replace(self, path, write):
+
+        """ Writes path atomically through write(file object), so concurrent readers never see a partial file """
+
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+
+def get_cache(cache):
+
+    """
+    LHECache for the cache argument of the parsers: an LHECache, a cache
+    directory, True for the default directory, False for no cache, or None
+    to use the default cache only if HEPTOOLS_CACHE_DIR is set
+    """
+
+    if isinstance(cache, LHECache):
+        return cache
+    if cache is None:
+        return LHECache() if os.environ.get("HEPTOOLS_CACHE_DIR") else None
+    if cache is False:
+        return None
+    return LHECache(None if cache is True else cache)
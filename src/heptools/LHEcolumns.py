@@ -0,0 +1,364 @@
+'''
+Columnar representation of LHE events.
+
+Rather than building one Python object per particle, blocks of events are
+converted in bulk into flat NumPy arrays: a table of the event-header values,
+an offsets array delimiting the particles of each event, and one contiguous
+column per particle attribute.
+
+iter_event_columns reads these blocks straight from the raw bytes of the file
+(memory-mapped, or streamed for compressed input) without building any XML
+elements.
+'''
+
+import mmap
+import re
+from contextlib import nullcontext
+
+import numpy as np
+
+from heptools.LHEio import compression, open_lhe
+from heptools.root_branches import UNDEFINED
+
+
+HEADER_FIELDS   = ("nparticles", "pid", "weight", "scale", "aqed", "aqcd")
+
+PARTICLE_FIELDS = ("id", "status", "mother1", "mother2", "color1", "color2",
+                   "px", "py", "pz", "e", "m", "lifetime", "spin")
+
+INTEGER_FIELDS  = PARTICLE_FIELDS[:6]
+
+# Opening tag of an event block, e.g. <event> or <event npLO=" -1 ">
+_EVENT_TAG = re.compile(rb"<event[\s>]")
+
+# An event block: the header line and the particle lines up to the first child element or </event>
+_EVENT_BLOCK = re.compile(rb"<event(?:\s[^>]*)?>\s*([^\n]*)\n([^<]*)")
+
+# The same, also capturing everything after the particle lines (<rwgt>, <scales>, ...) up to </event>
+_EVENT_BLOCK_WITH_TAIL = re.compile(rb"<event(?:\s[^>]*)?>\s*([^\n]*)\n([^<]*)((?:<(?!/event>)[^<]*)*)</event>")
+
+# Weight ids declared in the <initrwgt> header block
+_WEIGHT_ID = re.compile(rb"<weight\s[^>]*id\s*=\s*['\"]([^'\"]*)['\"]")
+
+# Markers of lines inside an event block which carry pdf or aMC@NLO information rather than particles.
+# Each marker is searched for on its own, literal searches being much faster than an alternation
+_SKIPPED_LINES = {str  : [re.compile(marker) for marker in ("pdf", "#aMCatNLO")],
+                  bytes: [re.compile(marker) for marker in (b"pdf", b"#aMCatNLO")]}
+
+
+def offsets_from_counts(counts):
+
+    """ Cumulative offsets array (length N+1) from N per-event counts """
+
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
+
+
+def drop_skipped_lines(text):
+
+    """ Removes every line (of a str or bytes text) containing one of the _SKIPPED_LINES markers """
+
+    newline = "\n" if isinstance(text, str) else b"\n"
+    hits    = sorted(match.start() for pattern in _SKIPPED_LINES[type(text)] for match in pattern.finditer(text))
+    pieces, start = [], 0
+    for hit in hits:
+        line_start = text.rfind(newline, 0, hit) + 1
+        if line_start < start:
+            continue # line already dropped
+        pieces.append(text[start:line_start])
+        line_end = text.find(newline, hit)
+        start    = len(text) if line_end < 0 else line_end
+    pieces.append(text[start:])
+    return newline[:0].join(pieces)
+
+
+def event_ranges(file_name, nranges):
+
+    """
+    Splits the events of an uncompressed LHE file at <event> boundaries into
+    at most nranges contiguous byte ranges of roughly equal size
+    Returns a list of (start, stop) byte offsets, each starting at an <event> tag
+    """
+
+    with open(file_name, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+
+        init  = mm.find(b"</init>")
+        first = _EVENT_TAG.search(mm, max(init, 0))
+        if first is None:
+            return []
+        last = mm.rfind(b"</event>")
+        if last < first.start():
+            return [] # no complete event
+        end = last + len(b"</event>")
+
+        cuts = [first.start()]
+        for i in range(1, nranges):
+            guess = cuts[0] + (end - cuts[0]) * i // nranges
+            match = _EVENT_TAG.search(mm, max(guess, cuts[-1] + 1), end)
+            if match is None:
+                break
+            cuts.append(match.start())
+        cuts.append(end)
+
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+class EventColumns:
+
+    """
+    Struct-of-arrays container for a block of LHE events
+    Args:
+    - header: (nevents, 6) array of the event-header values, see HEADER_FIELDS
+    - offsets: (nevents+1) array, the particles of event i are offsets[i]:offsets[i+1]
+    - particles: (13, nparticles) array of the particle records, see PARTICLE_FIELDS
+    - weights: (nevents, nweights) array of the <rwgt> weights, see weight_ids
+    """
+
+    def __init__(self, header, offsets, particles, weights=None):
+        self.header    = header
+        self.offsets   = offsets
+        self.particles = particles
+        self.weights   = weights if weights is not None else np.zeros((len(header), 0))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, field):
+        if field in HEADER_FIELDS:
+            return self.header[:, HEADER_FIELDS.index(field)]
+        column = self.particles[PARTICLE_FIELDS.index(field)]
+        return column.astype(np.int64) if field in INTEGER_FIELDS else column
+
+    @property
+    def counts(self):
+        return np.diff(self.offsets)
+
+    @property
+    def event_index(self):
+        """ Index of the parent event for every particle """
+        return np.repeat(np.arange(len(self)), self.counts)
+
+    @property
+    def local_index(self):
+        """ Position of every particle within its own event """
+        return np.arange(self.offsets[-1]) - self.offsets[:-1][self.event_index]
+
+    def to_awkward(self):
+
+        """
+        Awkward array of the events with the record layout of pylhe.to_awkward:
+        an eventinfo record and a list of particle records per event, all
+        values float64 and the momenta as (x, y, z, t) Momentum4D vectors
+        """
+
+        import awkward as ak
+        import vector
+        vector.register_awkward()
+
+        eventinfo = {field: self.header[:, i] for i, field in enumerate(HEADER_FIELDS)}
+        particles = {field: self.particles[i] for i, field in enumerate(PARTICLE_FIELDS)}
+        momentum  = {axis: particles.pop(field) for axis, field in (("x", "px"), ("y", "py"), ("z", "pz"), ("t", "e"))}
+        particles = {"vector": ak.zip(momentum, with_name="Momentum4D"), **particles}
+
+        return ak.zip({"eventinfo": ak.zip(eventinfo, with_name="EventInfo"),
+                       "particles": ak.unflatten(ak.zip(particles, depth_limit=1, with_name="Particle"), self.counts)},
+                      depth_limit=1, with_name="Event")
+
+    @classmethod
+    def concatenate(cls, blocks):
+
+        """ Joins a list of EventColumns blocks into one """
+
+        offsets = [blocks[0].offsets[:1]] + [block.offsets[1:] - block.offsets[0] for block in blocks]
+        shifts  = np.cumsum([0] + [block.offsets[-1] - block.offsets[0] for block in blocks[:-1]])
+        return cls(np.concatenate([block.header for block in blocks]),
+                   np.concatenate([offsets[0]] + [o + shift for o, shift in zip(offsets[1:], shifts)]),
+                   np.concatenate([block.particles for block in blocks], axis=1),
+                   np.concatenate([block.weights for block in blocks]))
+
+    @classmethod
+    def from_text(cls, blocks):
+
+        """
+        Builds the columns from a list of event-block texts, i.e. the text of
+        each <event> element: one header line followed by the particle lines
+        """
+
+        heads, bodies = [], []
+        for block in blocks:
+            head, _, body = block.lstrip().partition("\n")
+            heads.append(head)
+            bodies.append(body)
+
+        return cls.from_records("\n".join(heads), drop_skipped_lines("\n".join(bodies)))
+
+    @classmethod
+    def from_records(cls, heads, body, weights=None):
+
+        """
+        Builds the columns from the concatenated header lines and the
+        concatenated particle lines of a block of events, plus optionally
+        their (nevents, nweights) weights
+        """
+
+        header    = np.fromstring(heads, sep=" ")
+        particles = np.fromstring(body,  sep=" ")
+        if header.size % len(HEADER_FIELDS) or particles.size % len(PARTICLE_FIELDS):
+            raise ValueError("LHEcolumns: malformed event header or particle record")
+        header    = header.reshape(-1, len(HEADER_FIELDS))
+        particles = particles.reshape(-1, len(PARTICLE_FIELDS))
+
+        offsets = offsets_from_counts(header[:, 0].astype(np.int64))
+        if offsets[-1] != len(particles):
+            raise ValueError(f"LHEcolumns: {len(particles)} particle records found but the event headers declare {offsets[-1]}")
+
+        return cls(header, offsets, particles.T.copy(), weights)
+
+
+def weight_ids(file_name, block_size=1<<20):
+
+    """ Ids of the <weight> entries of the <initrwgt> header block, in file order """
+
+    header = b""
+    with open_lhe(file_name, threaded=False) as source:
+        while b"</initrwgt>" not in header and b"<event" not in header:
+            block = source.read(block_size)
+            if not block:
+                break
+            header += block
+
+    start = header.find(b"<initrwgt>")
+    if start < 0:
+        return []
+    return [weight_id.decode() for weight_id in _WEIGHT_ID.findall(header, start, header.find(b"</initrwgt>", start))]
+
+
+def parse_weights(tails, nweights=0):
+
+    """
+    (nevents, nweights) array of the <wgt> values in the <rwgt> block of each
+    event, from the event-block text following the particle lines.
+    The values are cut out of the joined blocks in bulk: splitting the
+    <wgt id=...> value </wgt> sequence at '>' leaves every value at an odd position.
+    Events without <rwgt> get UNDEFINED weights, as in the legacy parser;
+    nweights is the number of weights if no event has any (see weight_ids)
+    """
+
+    blocks = []
+    for tail in tails:
+        start = tail.find(b"<rwgt>")
+        blocks.append(tail[start + len(b"<rwgt>"):tail.find(b"</rwgt>", start)] if start >= 0 else b"")
+
+    counts = {block.count(b"<wgt") for block in blocks if block}
+    if len(counts) > 1:
+        raise ValueError("LHEcolumns: events carry different numbers of <wgt> weights")
+    nweights = counts.pop() if counts else nweights
+    present  = np.array([bool(block) for block in blocks], dtype=bool)
+    nblocks  = np.count_nonzero(present)
+
+    parts = b"".join(blocks).split(b">")
+    if len(parts) != 2*nweights*nblocks + 1:
+        raise ValueError("LHEcolumns: unexpected content in an <rwgt> block")
+    values = np.full((len(blocks), nweights), UNDEFINED)
+    values[present] = np.fromstring(b" ".join(parts[1::2]).replace(b"</wgt", b" "), sep=" ").reshape(nblocks, nweights)
+    return values
+
+
+def _event_buffers(file_name, byte_range=None, block_size=1<<24, timer=None):
+
+    """
+    Yields (buffer, start, stop) windows of the file, each holding whole events.
+    Uncompressed files are memory-mapped as a single window, compressed ones
+    are decompressed in blocks of block_size bytes cut after the last </event>
+    (charged to the read phase of timer, see heptools.LHEtiming)
+    """
+
+    if compression(file_name) is None:
+        # The map is released with its last reference, i.e. once no scan of it is in progress
+        with open(file_name, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        start, stop = byte_range if byte_range is not None else (max(mm.find(b"</init>"), 0), len(mm))
+        yield mm, start, stop
+        return
+
+    assert byte_range is None, "LHEcolumns: byte ranges need an uncompressed input file"
+    with open_lhe(file_name) as source:
+        remainder = b""
+        while True:
+            with timer.phase("read") if timer is not None else nullcontext():
+                block = source.read(block_size)
+            data  = remainder + block
+            if not block:
+                cut = len(data)
+            else:
+                # An event not completed in this block is carried whole to the next one
+                last = data.rfind(b"</event>")
+                cut  = last + len(b"</event>") if last >= 0 else 0
+            if cut > 0:
+                yield data, 0, cut
+            remainder = data[cut:]
+            if not block:
+                return
+
+
+def count_events(file_name, byte_range=None, window=1<<26):
+
+    """ Number of events of an LHE file (plain or compressed), or of a byte range of an uncompressed one """
+
+    end   = b"</event>"
+    count = 0
+    for buffer, start, stop in _event_buffers(file_name, byte_range):
+        # Slices overlap by len(end) - 1 bytes, so every tag lies whole in exactly one of them
+        for position in range(start, stop, window):
+            count += buffer[position:min(position + window + len(end) - 1, stop)].count(end)
+    return count
+
+
+def iter_event_columns(file_name, chunk_size=10000, byte_range=None, weights=False, timer=None):
+
+    """
+    Reads an LHE file (plain or compressed) chunk_size events at a time
+    without XML parsing, yielding one EventColumns block per chunk
+    Args:
+    - byte_range: optional (start, stop) byte offsets of an uncompressed file
+      covering whole events, see event_ranges
+    - weights: also read the <rwgt> weights of every event
+    - timer: optional heptools.LHEtiming.PhaseTimer counting the bytes read;
+      reads of memory-mapped files happen as page faults while scanning
+    """
+
+    pattern  = _EVENT_BLOCK_WITH_TAIL if weights else _EVENT_BLOCK
+    nweights = len(weight_ids(file_name)) if weights else 0
+    heads, bodies, tails = [], [], []
+
+    def columns():
+        return EventColumns.from_records(b"\n".join(heads), drop_skipped_lines(b"\n".join(bodies)),
+                                         parse_weights(tails, nweights) if weights else None)
+
+    for buffer, start, stop in _event_buffers(file_name, byte_range, timer=timer):
+        position = start
+        for match in pattern.finditer(buffer, start, stop):
+            heads.append(match.group(1))
+            bodies.append(match.group(2))
+            if weights:
+                tails.append(match.group(3))
+            if len(heads) == chunk_size:
+                if timer is not None:
+                    timer.count(nbytes=match.end() - position)
+                    position = match.end()
+                yield columns()
+                heads, bodies, tails = [], [], []
+        if timer is not None:
+            timer.count(nbytes=stop - position)
+
+    if heads:
+        yield columns()
+
+
+def read_event_columns(file_name, weights=False):
+
+    """ Reads all events of an LHE file into a single EventColumns block """
+
+    blocks = list(iter_event_columns(file_name, weights=weights))
+    return EventColumns.concatenate(blocks) if blocks else EventColumns.from_records("", "")
@@ -0,0 +1,63 @@
+'''
+Declarative configuration of the LHE ---> ROOT conversion.
+
+A configuration is a dict, or a YAML / JSON file holding one, e.g.
+
+    topology: ttbar
+    branches: [ttbar_m, cosp_hel, cosm_hel, "lp_*"]
+
+topology names a decay topology registered in LHE2Root (ttbar, single_top,
+ttZ, tW), and branches lists the output branches to write, as names or
+shell-style patterns. All branches of the topology are written by default.
+'''
+
+import fnmatch
+import json
+
+
+DEFAULT_CONFIG = {
+    "topology" : "ttbar",
+    "branches" : ["*"],
+}
+
+
+def load_config(source=None):
+
+    """
+    Configuration from a dict, a .yaml/.yml or .json file name, or the
+    default configuration if source is None; missing keys take their
+    DEFAULT_CONFIG value
+    """
+
+    if source is None:
+        config = {}
+    elif isinstance(source, dict):
+        config = dict(source)
+    elif source.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError("LHEconfig: YAML configuration files require the PyYAML module (pip install pyyaml)")
+        with open(source) as f:
+            config = yaml.safe_load(f) or {}
+    else:
+        with open(source) as f:
+            config = json.load(f)
+
+    unknown = set(config) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError(f"LHEconfig: unknown configuration keys {sorted(unknown)}")
+    config = {**DEFAULT_CONFIG, **config}
+    if isinstance(config["branches"], str):
+        config["branches"] = [config["branches"]]
+    return config
+
+
+def select_branches(available, patterns):
+
+    """ The names in available matching any of the patterns, in the order of available """
+
+    unmatched = [pattern for pattern in patterns if not fnmatch.filter(available, pattern)]
+    if unmatched:
+        raise ValueError(f"LHEconfig: no branch matches {unmatched}")
+    return [name for name in available if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)]
@@ -0,0 +1,122 @@
+'''
+Opening of plain or compressed LHE files.
+
+The compression (gzip, xz or zstd) is detected from the magic bytes at the
+start of the file, not from its name, and the decompressed bytes are
+streamed, so large samples never need to be unpacked to disk. By default
+decompression runs on a background thread which keeps a small queue of
+decompressed blocks ahead of the consumer, overlapping it with parsing.
+'''
+
+import gzip
+import io
+import lzma
+import queue
+import threading
+
+
+MAGIC_BYTES = {
+    b"\x1f\x8b"             : "gzip",
+    b"\xfd7zXZ\x00"         : "xz",
+    b"\x28\xb5\x2f\xfd"     : "zstd",
+}
+
+
+def compression(file_name):
+
+    """ Name of the compression of file_name ("gzip", "xz", "zstd") or None """
+
+    with open(file_name, "rb") as f:
+        start = f.read(max(len(magic) for magic in MAGIC_BYTES))
+    for magic, name in MAGIC_BYTES.items():
+        if start.startswith(magic):
+            return name
+    return None
+
+
+def _decompressed_stream(file_name, method):
+
+    if method == "gzip":
+        return gzip.open(file_name, "rb")
+    if method == "xz":
+        return lzma.open(file_name, "rb")
+    if method == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("LHEio: reading zstd-compressed files requires the zstandard module (pip install zstandard)")
+        return zstandard.ZstdDecompressor().stream_reader(open(file_name, "rb"), closefd=True)
+    return open(file_name, "rb")
+
+
+class ThreadedReader(io.RawIOBase):
+
+    """
+    Read-only raw stream fed by a background thread which reads blocks of
+    block_size bytes from the wrapped stream into a queue of at most
+    queue_size blocks
+    """
+
+    def __init__(self, stream, block_size=1<<20, queue_size=8):
+        self.stream  = stream
+        self.blocks  = queue.Queue(maxsize=queue_size)
+        self.pending = memoryview(b"")
+        self.error   = None
+        self.closing = threading.Event()
+        self.thread  = threading.Thread(target=self._fill, args=(block_size,), daemon=True)
+        self.thread.start()
+
+    def _fill(self, block_size):
+        try:
+            while not self.closing.is_set():
+                block = self.stream.read(block_size)
+                self.blocks.put(block)
+                if not block:
+                    break
+        except Exception as error:
+            self.error = error
+            self.blocks.put(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self.pending:
+            self.pending = memoryview(self.blocks.get())
+            if not self.pending:
+                if self.error is not None:
+                    raise self.error
+                self.blocks.put(b"") # stay at end-of-file for later reads
+                return 0
+        n = min(len(buffer), len(self.pending))
+        buffer[:n] = self.pending[:n]
+        self.pending = self.pending[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self.closing.set()
+            while self.thread.is_alive():
+                try:
+                    self.blocks.get_nowait()
+                except queue.Empty:
+                    self.thread.join(0.01)
+            self.stream.close()
+        super().close()
+
+
+def open_lhe(file_name, threaded=True, block_size=1<<20):
+
+    """
+    Opens a plain, gzip-, xz- or zstd-compressed LHE file as a binary stream
+    of the decompressed bytes
+    Args:
+    - threaded: decompress on a background thread (compressed files only)
+    - block_size: size of the blocks handed over by the background thread
+    """
+
+    method = compression(file_name)
+    stream = _decompressed_stream(file_name, method)
+    if method is None or not threaded:
+        return stream
+    return io.BufferedReader(ThreadedReader(stream, block_size), buffer_size=block_size)
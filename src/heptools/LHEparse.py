@@ -1,8 +1,11 @@
 
+from itertools import islice
+
 import numpy as np
-import pylhe
 import awkward as ak
 
+from heptools.LHEcache import get_cache
+
 class LHEparse:
 
     """
@@ -10,7 +13,13 @@ class LHEparse:
     Particles are identified by the pdgid number as defined in the class
     dictionary PDGID
     Args:
-    - 
+    - file_name: the LHE file (plain or compressed)
+    - backend: "pylhe" to read with pylhe, or "numpy" to read with the bulk
+      tokenizer of heptools.LHEcolumns (same array layout, much faster)
+    - cache: on-disk cache of the parsed array, see heptools.LHEcache.get_cache
+      (by default used only if HEPTOOLS_CACHE_DIR is set)
+    The file is read into memory on the first access to array; iterate()
+    streams it instead, holding one chunk of events at a time
     """
       
     PDGID = {
@@ -43,35 +52,171 @@ class LHEparse:
 
 
 
-    def __init__(self , file_name:str):
+    def __init__(self , file_name:str, backend:str="pylhe", cache=None):
+        if backend not in ("pylhe", "numpy"):
+            raise ValueError(f"Unknown LHE backend {backend}, choose 'pylhe' or 'numpy'")
         self.file_name      = file_name
-        print(f"Parsing LHE file {self.file_name}")
-        self.array            =  pylhe.to_awkward(pylhe.read_lhe_with_attributes(self.file_name))
+        self.backend        = backend
+        self.cache          = get_cache(cache)
+        self._array         = None
+
+
+    @property
+    def array(self):
+
+        """ Awkward array of all the events of the file, read on first access """
+
+        if self._array is None:
+            print(f"Parsing LHE file {self.file_name}")
+            if self.cache is not None:
+                self._array = self.cache.cached(self.file_name, f"LHEparse-{self.backend}", lambda: next(self.iter_arrays()))
+            else:
+                self._array = next(self.iter_arrays())
+        return self._array
+
+
+    def iter_arrays(self, step_size:int=None):
+
+        """
+        Yields the raw awkward event arrays of the file, step_size events at a
+        time, or the whole file at once if step_size is None
+        """
+
+        if self.backend == "pylhe":
+            import pylhe
+            events = pylhe.read_lhe_with_attributes(self.file_name)
+            if step_size is None:
+                yield pylhe.to_awkward(events)
+                return
+            while True:
+                chunk = list(islice(events, step_size))
+                if not chunk:
+                    return
+                yield pylhe.to_awkward(chunk)
+        else:
+            from heptools.LHEcolumns import iter_event_columns, read_event_columns
+            if step_size is None:
+                yield read_event_columns(self.file_name).to_awkward()
+                return
+            for events in iter_event_columns(self.file_name, step_size):
+                yield events.to_awkward()
+
+
+    def iterate(self, step_size:int=100000):
+
+        """
+        Streams the file, yielding the events step_size at a time in the
+        build() layout; peak memory is bounded by the chunk size.
+        Every chunk has a field for each particle of the PDGID dict, an empty
+        list per event where the chunk holds none, so that all chunks share
+        the same fields
+        """
+
+        for array in self.iter_arrays(step_size):
+            yield self._build(array, all_species=True)
 
 
     def build(self):
         
         """
         Builds a flat awkward event array indexed by the particles names, 
-            as given by the values of the PDGID dict.
-        Supplemental composite fields for combined quark- and lepton-types.
+            as given by the values of the PDGID dict, for the PDGIDs which
+            exist in the imported array.
+        Supplemental composite collections for combined quark- and lepton-types,
+            built on first access, see BuiltEventArray.
         """
-        
-        # Parse only the PDGIDs which exist in the imported array
-        unique_keys    = np.unique(self.array.particles.id.to_numpy())
-        PDGID_filtered = {k:v for k,v in self.PDGID.items() if k in unique_keys}
-        
-        columns = {}
-        for k,v in PDGID_filtered.items():
-            columns[v] = self.array.particles[self.array.particles.id==k]
-            
-        columns["up_type_quarks"]        = ak.concatenate([columns["up"],columns["charm"],columns["top"]],axis=1)
-        columns["anti_up_type_quarks"]   = ak.concatenate([columns["anti_up"],columns["anti_charm"],columns["anti_top"]],axis=1)
-
-        columns["down_type_quarks"]      = ak.concatenate([columns["down"],columns["strange"],columns["bottom"]],axis=1)
-        columns["anti_down_type_quarks"] = ak.concatenate([columns["anti_down"],columns["anti_strange"],columns["anti_bottom"]],axis=1)
-
-        columns["positive_leptons"]      = ak.concatenate([columns["anti_electron"],columns["anti_muon"]],axis=1)
-        columns["negative_leptons"]      = ak.concatenate([columns["electron"],columns["muon"]],axis=1)
-        
-        return ak.zip(columns, depth_limit=1, with_name="Event")
+
+        return self._build(self.array)
+
+
+    COMPOSITES = {
+    "up_type_quarks"        : ("up","charm","top"),
+    "anti_up_type_quarks"   : ("anti_up","anti_charm","anti_top"),
+    "down_type_quarks"      : ("down","strange","bottom"),
+    "anti_down_type_quarks" : ("anti_down","anti_strange","anti_bottom"),
+    "positive_leptons"      : ("anti_electron","anti_muon"),
+    "negative_leptons"      : ("electron","muon"),
+    }
+
+
+    @classmethod
+    def _build(cls, array, all_species=False):
+
+        """
+        build() of array, with a field for every particle of the PDGID dict if
+        all_species, else only for those present.
+        The particles are grouped by species in a single stable sort of the
+        flattened id column, so each species (and each composite) is a slice
+        of one reordered particle array, in the original order within events
+        """
+
+        counts  = ak.num(array.particles).to_numpy()
+        flat    = ak.flatten(array.particles)
+        event   = np.repeat(np.arange(len(counts)), counts)
+
+        # Species number of every particle in the sorted PDGID keys, len(keys) for other ids
+        keys    = np.array(sorted(cls.PDGID))
+        ids     = flat.id.to_numpy()
+        species = np.searchsorted(keys, ids)
+        species[keys[np.minimum(species, len(keys) - 1)] != ids] = len(keys)
+
+        order   = np.argsort(species, kind="stable")
+        bounds  = np.concatenate([[0], np.cumsum(np.bincount(species, minlength=len(keys) + 1))])
+        grouped = flat[order]
+        event   = event[order]
+
+        # Positions in grouped of each species present
+        ranges  = {}
+        for k, v in cls.PDGID.items():
+            i = np.searchsorted(keys, k)
+            if all_species or bounds[i+1] > bounds[i]:
+                ranges[v] = (bounds[i], bounds[i+1])
+
+        columns = {name: ak.unflatten(grouped[start:stop], np.bincount(event[start:stop], minlength=len(counts)))
+                   for name, (start, stop) in ranges.items()}
+
+        # The composite collections are added on access by BuiltEventArray
+        return ak.zip(columns, depth_limit=1, with_name="Event", behavior=BUILT_EVENT_BEHAVIOR)
+
+
+class BuiltEventArray(ak.Array):
+
+    """
+    Events of LHEparse.build(): the composite collections of
+    LHEparse.COMPOSITES are not fields of the array but are built on first
+    access, as attributes or by name, and memoised on the array
+    """
+
+    def __getitem__(self, where):
+        if isinstance(where, str) and where in LHEparse.COMPOSITES:
+            return self.composite(where)
+        return super().__getitem__(where)
+
+    def composite(self, name):
+
+        """
+        The particles of the species of LHEparse.COMPOSITES[name], per event
+        those of the first species before those of the next
+        """
+
+        memo = self.__dict__.setdefault("_composites", {})
+        if name not in memo:
+            # Fields read through ak.Array, so that they follow any mask or index of the events
+            field   = super().__getitem__
+            members = [field(member) for member in LHEparse.COMPOSITES[name] if member in self.fields]
+            if not members:
+                memo[name] = field(self.fields[0])[:, :0]
+            else:
+                # A stable sort by event of the members' particles, concatenated in order
+                event  = np.concatenate([np.repeat(np.arange(len(self)), ak.num(member).to_numpy()) for member in members])
+                order  = np.argsort(event, kind="stable")
+                memo[name] = ak.unflatten(ak.concatenate([ak.flatten(member) for member in members])[order],
+                                          np.bincount(event, minlength=len(self)))
+        return memo[name]
+
+
+for _name in LHEparse.COMPOSITES:
+    setattr(BuiltEventArray, _name, property(lambda self, name=_name: self.composite(name)))
+
+# Overlaid on ak.behavior for the arrays returned by build()
+BUILT_EVENT_BEHAVIOR = {("*", "Event"): BuiltEventArray}
@@ -0,0 +1,156 @@
+'''
+Throughput and phase-timing instrumentation for the LHE parsers.
+
+A PhaseTimer counts the events and input bytes processed, prints a progress
+line at most once per interval seconds, and, when enabled, accumulates the
+wall time spent in each phase of the conversion:
+
+    read        reading (and decompressing) the input
+    tokenize    splitting the input into events and particle records
+    kinematics  computing the branch values
+    fill        filling the TTree
+    write       writing the output file
+
+Phases may be nested (e.g. a read inside a tokenize step); each phase is
+charged only for its own time, so the phase times add up to at most the
+wall time.
+'''
+
+import json
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+
+PHASES = ("read", "tokenize", "kinematics", "fill", "write")
+
+
+class PhaseTimer:
+
+    """
+    Args:
+    - enabled: accumulate the per-phase times (the counters and the progress
+      line are always kept)
+    - interval: minimum number of seconds between two progress lines
+    - stream: where the progress lines go
+    """
+
+    def __init__(self, enabled=False, interval=10., stream=sys.stdout):
+        self.enabled  = enabled
+        self.interval = interval
+        self.stream   = stream
+        self.times    = dict.fromkeys(PHASES, 0.)
+        self.events   = 0
+        self.bytes    = 0
+        self.start    = time.perf_counter()
+        self.reported = self.start
+        self._stack   = []
+
+    @contextmanager
+    def _timed(self, name):
+        now = time.perf_counter()
+        if self._stack:
+            outer, since = self._stack[-1]
+            self.times[outer] += now - since
+        self._stack.append((name, now))
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            name, since = self._stack.pop()
+            self.times[name] = self.times.get(name, 0.) + now - since
+            if self._stack:
+                self._stack[-1] = (self._stack[-1][0], now)
+
+    def phase(self, name):
+
+        """ Context manager charging its wall time to phase name (a no-op unless enabled) """
+
+        return self._timed(name) if self.enabled else nullcontext()
+
+    def timed_iter(self, iterable, name):
+
+        """ Iterates over iterable, charging the time spent producing each item to phase name """
+
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def count(self, events=0, nbytes=0):
+
+        """ Adds processed events and input bytes, and reports progress if due """
+
+        self.events += events
+        self.bytes  += nbytes
+        now = time.perf_counter()
+        if now - self.reported >= self.interval:
+            self.reported = now
+            print(f"LHEparser: Event number {self.events} ({self.rates(now)})", file=self.stream, flush=True)
+
+    def rates(self, now=None):
+        elapsed = (now or time.perf_counter()) - self.start
+        return f"{self.events/elapsed:.0f} events/s, {self.bytes/elapsed/1e6:.1f} MB/s"
+
+    def summary(self):
+
+        """ Dictionary of the counters, rates and per-phase times """
+
+        wall = time.perf_counter() - self.start
+        return {"events"        : self.events,
+                "bytes"         : self.bytes,
+                "wall_time"     : wall,
+                "events_per_s"  : self.events / wall if wall > 0 else 0.,
+                "bytes_per_s"   : self.bytes / wall if wall > 0 else 0.,
+                "phases"        : dict(self.times) if self.enabled else {}}
+
+    def report(self, json_file=None):
+
+        """ Prints the final throughput, and writes the summary to json_file if given """
+
+        summary = self.summary()
+        print(f"LHEparser: {self.events} events in {summary['wall_time']:.2f} s ({self.rates()})", file=self.stream, flush=True)
+        if self.enabled:
+            print("LHEparser: " + ", ".join(f"{name} {seconds:.2f} s" for name, seconds in summary["phases"].items()), file=self.stream, flush=True)
+        if json_file is not None:
+            write_summary(summary, json_file)
+        return summary
+
+
+class TimedReader:
+
+    """ File-like wrapper charging the read() calls on stream to the read phase of timer and counting the bytes """
+
+    def __init__(self, stream, timer):
+        self.stream = stream
+        self.timer  = timer
+
+    def read(self, size=-1):
+        with self.timer.phase("read"):
+            data = self.stream.read(size)
+        self.timer.count(nbytes=len(data))
+        return data
+
+
+def merge_summaries(summaries, wall_time):
+
+    """ Combines the summaries of processes which ran concurrently for wall_time seconds """
+
+    merged = {"events": sum(s["events"] for s in summaries), "bytes": sum(s["bytes"] for s in summaries), "wall_time": wall_time}
+    merged["events_per_s"] = merged["events"] / wall_time if wall_time > 0 else 0.
+    merged["bytes_per_s"]  = merged["bytes"] / wall_time if wall_time > 0 else 0.
+    merged["phases"] = {}
+    for s in summaries:
+        for name, seconds in s["phases"].items():
+            merged["phases"][name] = merged["phases"].get(name, 0.) + seconds
+    merged["processes"] = summaries
+    return merged
+
+
+def write_summary(summary, json_file):
+    with open(json_file, "w") as f:
+        json.dump(summary, f, indent=2)
@@ -0,0 +1,61 @@
+'''
+Scalar output branches.
+
+Quantities with exactly one value per event are booked as plain Float_t /
+Int_t leaves rather than std::vector branches. ScalarBranch keeps the
+push_back / resize / [0] interface of the vectors, so the code filling a
+branch does not depend on how it was booked.
+'''
+
+import numpy as np
+
+
+# Value of a scalar branch in events where its quantity is not defined,
+# the same sentinel as for undefined spin-analysing angles
+UNDEFINED = -55.
+
+LEAF_TYPES = {
+    'float' : ('F', np.float32),
+    'int'   : ('I', np.int32),
+}
+
+
+class ScalarBranch:
+
+    """
+    Single Float_t or Int_t leaf of tree, backed by a one-element NumPy buffer
+    Args:
+    - branch_type: 'float' or 'int'
+    - default: value stored when nothing is pushed for an event
+    """
+
+    def __init__(self, name, branch_type, tree, default=UNDEFINED):
+        code, dtype  = LEAF_TYPES[branch_type]
+        self.default = default
+        self.buffer  = np.full(1, default, dtype=dtype)
+        tree.Branch(name, self.buffer, f"{name}/{code}")
+
+    def push_back(self, value):
+        self.buffer[0] = value
+
+    def resize(self, size):
+        if size == 0:
+            self.buffer[0] = self.default
+
+    def __getitem__(self, index):
+        return self.buffer[index]
+
+
+def dense_column(content, offsets, dtype, default=UNDEFINED):
+
+    """
+    One value per event from a (content, offsets) column holding at most one
+    value per event, default where it holds none
+    """
+
+    counts = np.diff(offsets)
+    if np.any(counts > 1):
+        raise ValueError("root_branches: a scalar branch received more than one value in an event")
+    values = np.full(len(counts), default, dtype=dtype)
+    values[counts == 1] = content
+    return values
@@ -3,6 +3,9 @@
 
 from ROOT import TTree, TFile, vector, gROOT, TLorentzVector
 
+from heptools.root_branches import ScalarBranch
+from heptools.uproot_skim import columnar_skim
+
 
 def ResetBranches(dictionary):
 
@@ -10,9 +13,9 @@ def ResetBranches(dictionary):
 		dictionary[key].resize(0)
 
 
-def BookBranch(name, suffix, tree):
+def BookBranch(name, suffix, tree, scalar=False):
 
-    """ Function to book branches to an output TTree """
+    """ Function to book branches to an output TTree, as a scalar leaf if scalar else a vector """
 
     branch_type = 'null'
     if "F" in suffix:
@@ -22,13 +25,74 @@ def BookBranch(name, suffix, tree):
     else:
         print("WARNING: Type not recognised",suffix)
 
+    if scalar:
+        return ScalarBranch(name, branch_type, tree)
     branch = vector(branch_type)(20)
     tree.Branch(name, branch)
     return branch
 
 
+def BranchSuffix(tree, name):
+
+    """ Type suffix of a branch of tree: "F" or "I", prefixed by "V" for a vector branch """
+
+    type_name = tree.GetLeaf(name).GetTypeName()
+    suffix    = "I" if "int" in type_name.lower() else "F"
+    return "V" + suffix if type_name.startswith("vector") else suffix
+
+
+def _tree_inputs(input_tree):
+
+    """ Files and path in the files of a PyROOT TTree or TChain """
+
+    if input_tree.InheritsFrom("TChain"):
+        return [element.GetTitle() for element in input_tree.GetListOfFiles()], input_tree.GetName()
+    directory = input_tree.GetDirectory().GetPath().split(":", 1)[-1].strip("/")
+    return [input_tree.GetCurrentFile().GetName()], "/".join(filter(None, [directory, input_tree.GetName()]))
+
+
 def generic_tree_skim(input_tree,branches2keep,**kwargs):
 
+    """
+    Copies the branches2keep of input_tree (a TTree read from a file, or a
+    TChain) to a new tree, reading its files in chunks with uproot
+    (heptools.uproot_skim.columnar_skim), which keeps the branch types.
+    A std::vector<T> input branch is written as a variable-size array T[]
+    with its counter branch n<branch>, not as a std::vector: macros binding
+    it with SetBranchAddress to a vector<T>* must bind a T array instead,
+    or use columnar=False
+    Keyword arguments:
+    - tree_name: output tree, <input tree name>_skimmed by default
+    - file_name: output file, <tree_name>.root by default
+    - cut_off: maximum number of entries read
+    - step_size: entries read per chunk, a number or a size such as "100 MB"
+    - selection: expression over the branches selecting the entries copied,
+      e.g. "(njets >= 4) & (ak.firsts(lep_pt) > 25e3)", see
+      heptools.uproot_skim.selection_cuts; a cutflow is printed at the end
+    - columnar: False to copy the entries one by one with PyROOT instead,
+      see legacy_tree_skim
+    Returns the cutflow, the numbers of entries read then passing each cut
+    """
+
+    if not kwargs.get("columnar", True):
+        if kwargs.get("selection") is not None:
+            raise ValueError("generic_tree_skim: selection requires the columnar skim")
+        return legacy_tree_skim(input_tree, branches2keep, **kwargs)
+
+    new_tree_name = kwargs["tree_name"] if "tree_name" in kwargs else input_tree.GetName() + "_skimmed"
+    files, path   = _tree_inputs(input_tree)
+    return columnar_skim(files, path, branches2keep,
+                         file_name        = kwargs.get("file_name", new_tree_name + ".root"),
+                         output_tree_name = new_tree_name,
+                         cut_off          = kwargs.get("cut_off"),
+                         step_size        = kwargs.get("step_size", "100 MB"),
+                         selection        = kwargs.get("selection"))
+
+
+def legacy_tree_skim(input_tree,branches2keep,**kwargs):
+
+    """ generic_tree_skim entry by entry through PyROOT, writing float or int scalars and vectors """
+
     # Define new tree name
     new_tree_name   = kwargs["tree_name"] if "tree_name" in kwargs else input_tree.GetName() + "_skimmed"
     output_filename = kwargs["file_name"] if "file_name" in kwargs else new_tree_name+".root"
@@ -47,7 +111,8 @@ def generic_tree_skim(input_tree,branches2keep,**kwargs):
     # Store branches here
     branch_dict = {} 
     for branch in branches2keep:
-        branch_dict[branch] = BookBranch(branch, "F", output_tree)        
+        suffix = BranchSuffix(input_tree, branch)
+        branch_dict[branch] = BookBranch(branch, suffix, output_tree, scalar="V" not in suffix)
 
     total_events = input_tree.GetEntries()
 
@@ -3,6 +3,8 @@
 
 from ROOT import TTree, TFile, vector, gROOT, TLorentzVector
 
+from heptools.root_branches import ScalarBranch
+
 
 def ResetBranches(dictionary):
 
@@ -10,9 +12,9 @@ def ResetBranches(dictionary):
 		dictionary[key].resize(0)
 
 
-def BookBranch(name, suffix, tree):
+def BookBranch(name, suffix, tree, scalar=False):
 
-    """ Function to book branches to an output TTree """
+    """ Function to book branches to an output TTree, as a scalar leaf if scalar else a vector """
 
     branch_type = 'null'
     if "F" in suffix:
@@ -22,11 +24,22 @@ def BookBranch(name, suffix, tree):
     else:
         print("WARNING: Type not recognised",suffix)
 
+    if scalar:
+        return ScalarBranch(name, branch_type, tree)
     branch = vector(branch_type)(20)
     tree.Branch(name, branch)
     return branch
 
 
+def BranchSuffix(tree, name):
+
+    """ Type suffix of a branch of tree: "F" or "I", prefixed by "V" for a vector branch """
+
+    type_name = tree.GetLeaf(name).GetTypeName()
+    suffix    = "I" if "int" in type_name.lower() else "F"
+    return "V" + suffix if type_name.startswith("vector") else suffix
+
+
 def generic_tree_skim(input_tree,branches2keep,**kwargs):
 
     # Define new tree name
@@ -46,7 +59,8 @@ def generic_tree_skim(input_tree,branches2keep,**kwargs):
     # Store branches here
     branch_dict = {} 
     for branch in branches2keep:
-        branch_dict[branch] = BookBranch(branch, "F", output_tree)        
+        suffix = BranchSuffix(input_tree, branch)
+        branch_dict[branch] = BookBranch(branch, suffix, output_tree, scalar="V" not in suffix)
 
     total_events = input_tree.GetEntries()
 
@@ -1,5 +1,10 @@
+from collections import namedtuple
+
+import numpy as np
 import vector 
 
+from heptools.ttbar_boosts import parent_top_directions
+
 
 """"
 Non--ROOT-based tools for computing particular angular observables from which
@@ -17,27 +22,15 @@ def boost_to_parent_tops(top:'MomentumObject4D',anti_top:'MomentumObject4D',
     Boosts the leptons in their respective parent top's frame
     Computes the unit 3-vectors of the top in the ttbar CoM, and the leptons in
     their parent tops' frame
+    Also takes arrays of events (see helicity_basis_angular_observables_array),
+    returning NumPy vector arrays; the boosts are done by
+    heptools.ttbar_boosts.parent_top_directions
     """
 
-    # Build ttbar system
-    ttbar = top + anti_top 
-
-    # Boost tops lab --> ttbar_CoM
-    top_in_CoM      = top.boostCM_of(ttbar)
-    antitop_in_CoM  = anti_top.boostCM_of(ttbar) 
-
-    # Boost leptons lab --> ttbar_CoM --> parent_tops'_CoM
-    leptonP_in_CoM     = leptonP.boostCM_of(ttbar)
-    leptonM_in_CoM     = leptonM.boostCM_of(ttbar)
-    leptonP_in_top     = leptonP_in_CoM.boostCM_of(top_in_CoM)
-    leptonM_in_antitop = leptonM_in_CoM.boostCM_of(antitop_in_CoM)
-    
-    # Compute the unit 3-vector directions
-    direction = top_in_CoM.to_beta3().unit()
-    leptonP_direction = leptonP_in_top.to_beta3().unit()
-    leptonM_direction = leptonM_in_antitop.to_beta3().unit()
-
-    return direction,leptonP_direction,leptonM_direction
+    directions = parent_top_directions(*(_components(p) for p in (top,anti_top,leptonP,leptonM)))
+    if isinstance(top, vector.VectorObject4D):
+        return tuple(vector.obj(x=float(d[0][0]), y=float(d[1][0]), z=float(d[2][0])) for d in directions)
+    return tuple(vector.array({"x": d[0], "y": d[1], "z": d[2]}) for d in directions)
 
 
 def cos_k(Kdirection,leptonP_direction,leptonM_direction):
@@ -47,54 +40,250 @@ def cos_k(Kdirection,leptonP_direction,leptonM_direction):
     return cos_plus, cos_minus
 
 
-def cos_n(Kdirection,leptonP_direction,leptonM_direction):
+def _transverse_axes(kx, ky, kz):
+
+    """
+    The n and r axes of the helicity basis of the unit top direction k, with
+    z the beam axis: n = z x k / sin_T and r = (z - cos_T k) / sin_T, each
+    multiplied by the sign A of cos_T (-1 for cos_T = 0)
+    """
 
-    z     = vector.obj(x=0,y=0,z=1)
-    cos_T = z.dot(Kdirection)
-    sin_T = (1 - cos_T**2)**0.5
-    Ndirection = z.cross(Kdirection)/sin_T
+    cos_T = kz
+    scale = np.where(cos_T > 0, 1., -1.) / np.sqrt(1 - cos_T**2)
+    return (-ky*scale, kx*scale, 0.*scale), (-cos_T*kx*scale, -cos_T*ky*scale, (1 - cos_T*kz)*scale)
 
-    A = 1 if cos_T > 0 else -1
 
-    cos_plus  = A*Ndirection.dot(leptonP_direction)
-    cos_minus = -A*Ndirection.dot(leptonM_direction) 
+def _dot(a, b):
+    return a[0]*b[0] + a[1]*b[1] + a[2]*b[2]
+
+
+def _xyz(direction):
+    return direction.x, direction.y, direction.z
+
+
+def cos_n(Kdirection,leptonP_direction,leptonM_direction):
+
+    Ndirection, _ = _transverse_axes(*_xyz(Kdirection))
+    cos_plus  = _dot(Ndirection, _xyz(leptonP_direction))
+    cos_minus = -_dot(Ndirection, _xyz(leptonM_direction))
     return cos_plus, cos_minus
 
 
 def cos_r(Kdirection,leptonP_direction,leptonM_direction):
 
-    z     = vector.obj(x=0,y=0,z=1)
-    cos_T = z.dot(Kdirection)
-    sin_T = (1 - cos_T**2)**0.5
-    Rdirection =  1/sin_T * (z - cos_T*Kdirection)
+    _, Rdirection = _transverse_axes(*_xyz(Kdirection))
+    cos_plus  = _dot(Rdirection, _xyz(leptonP_direction))
+    cos_minus = -_dot(Rdirection, _xyz(leptonM_direction))
+    return cos_plus, cos_minus
 
-    A = 1 if cos_T > 0 else -1
 
-    cos_plus  = A*Rdirection.dot(leptonP_direction)
-    cos_minus = -A*Rdirection.dot(leptonM_direction) 
-    return cos_plus, cos_minus
+# Fields of the structured array of helicity_basis_angular_observables_array
+OBSERVABLES      = ("cos_k_p", "cos_k_m", "cos_n_p", "cos_n_m", "cos_r_p", "cos_r_m", "cos_phi")
+OBSERVABLE_DTYPE = np.dtype([(name, np.float64) for name in OBSERVABLES])
+
+
+def _components(p):
 
+    """ (x, y, z, t) of a vector.obj, or of a NumPy or flat awkward 4D vector array, as 1-d float arrays """
+
+    return tuple(np.atleast_1d(np.asarray(getattr(p, c), dtype=np.float64)) for c in ("x", "y", "z", "t"))
+
+
+def helicity_basis_angular_observables_array(top,antitop,lepP,lepM):
+
+    """
+    Batch version of helicity_basis_angular_observables: the arguments are
+    NumPy (vector.array) or flat awkward Momentum4D arrays of the events, or
+    single vector.obj, and the seven observables are computed in one
+    vectorised pass, sharing the boosts (parent_top_directions) and the
+    helicity axes.
+    Returns a structured array of fields OBSERVABLES, one entry per event
+    """
+
+    top, antitop, lepP, lepM = (_components(p) for p in (top, antitop, lepP, lepM))
+    Kdirection, lepP_direction, lepM_direction = parent_top_directions(top, antitop, lepP, lepM)
+    Ndirection, Rdirection = _transverse_axes(*Kdirection)
+
+    obs = np.empty(len(top[0]), dtype=OBSERVABLE_DTYPE)
+    obs["cos_k_p"] =  _dot(Kdirection, lepP_direction)
+    obs["cos_k_m"] = -_dot(Kdirection, lepM_direction)
+    obs["cos_n_p"] =  _dot(Ndirection, lepP_direction)
+    obs["cos_n_m"] = -_dot(Ndirection, lepM_direction)
+    obs["cos_r_p"] =  _dot(Rdirection, lepP_direction)
+    obs["cos_r_m"] = -_dot(Rdirection, lepM_direction)
+    obs["cos_phi"] =  _dot(lepP_direction, lepM_direction)
+    return obs
 
 
 def helicity_basis_angular_observables(top,antitop,lepP,lepM):
 
     """
     Builds the helicity-basis angular observables plus cos_phi
+    For single vector.obj returns a dict of floats, for arrays of events the
+    structured array of helicity_basis_angular_observables_array, from the
+    same computation
     """
 
-    Kdirection, lepP_direction, lepM_direction = boost_to_parent_tops(top,antitop,lepP,lepM)
-    obs = {}
-    obs["cos_k_p"], obs["cos_k_m"] = cos_k(Kdirection,lepP_direction,lepM_direction)
-    obs["cos_n_p"], obs["cos_n_m"] = cos_n(Kdirection,lepP_direction,lepM_direction)
-    obs["cos_r_p"], obs["cos_r_m"] = cos_r(Kdirection,lepP_direction,lepM_direction)
-    obs["cos_phi"]                 = lepP_direction.dot(lepM_direction)
+    obs = helicity_basis_angular_observables_array(top,antitop,lepP,lepM)
+    if isinstance(top, vector.VectorObject4D):
+        return {name: float(obs[name][0]) for name in OBSERVABLES}
     return obs
 
 
 def cos_phi(top,antitop,lepP,lepM):
 
-    Kdirection, lepP_direction, lepM_direction = boost_to_parent_tops(top,antitop,lepP,lepM)
-    return lepP_direction.dot(lepM_direction)
+    obs = helicity_basis_angular_observables_array(top,antitop,lepP,lepM)["cos_phi"]
+    return float(obs[0]) if isinstance(top, vector.VectorObject4D) else obs
+
+
+# Spin bases of spin_basis_observables: name ---> SpinBasis, see register_basis
+SpinBasis  = namedtuple("SpinBasis", ["name", "axes", "build"])
+SPIN_BASES = {}
+
+
+def register_basis(name, axes, build):
+
+    """
+    Makes a spin basis available to spin_basis_observables under name
+    Args:
+    - axes: the names of its three axes
+    - build: function build(k, beta) of the unit top direction k = (kx, ky,
+      kz) in the ttbar CoM frame and of the top velocity beta in that frame
+      (arrays of the events), returning one (x, y, z) axis per name of axes,
+      together a right-handed orthonormal triad. As in the helicity basis, the l+ direction is projected on each
+      axis and the l- direction on the opposite axis
+    """
+
+    if len(set(axes)) != len(axes):
+        raise ValueError(f"spin_observables: the axes of basis {name} must have distinct names, not {axes}")
+    if name == "cos_phi":
+        raise ValueError("spin_observables: cos_phi is not a valid basis name")
+    SPIN_BASES[name] = SpinBasis(name, tuple(axes), build)
+    return SPIN_BASES[name]
+
+
+def _helicity_basis(k, beta):
+    Ndirection, Rdirection = _transverse_axes(*k)
+    return k, Ndirection, Rdirection
+
+
+def _beam_basis(k, beta):
+    zero, one = np.zeros_like(k[0]), np.ones_like(k[0])
+    return (one, zero, zero), (zero, one, zero), (zero, zero, one)
+
+
+def _transverse_basis(k, beta):
+
+    """ The transverse direction of the top t, the normal n of the production plane, and the beam direction z closest to the top """
+
+    sign  = np.where(k[2] > 0, 1., -1.)
+    sin_T = np.sqrt(1 - k[2]**2)
+    Ndirection, _ = _transverse_axes(*k)
+    zero = np.zeros_like(k[0])
+    return (k[0]/sin_T, k[1]/sin_T, zero), Ndirection, (zero, zero, sign)
+
+
+def _off_diagonal_basis(k, beta):
+
+    """
+    The off-diagonal axis d, in the production plane at the angle psi from
+    the beam direction closest to the top, tan(psi) = beta^2 sin_T cos_T /
+    (1 - beta^2 sin_T^2): the beam axis at threshold, the top direction for
+    beta -> 1; then the normal n of the production plane and d x n
+    """
+
+    (tx, ty, _), Ndirection, (_, _, sign) = _transverse_basis(k, beta)
+    cos_T = np.abs(k[2])
+    sin_T = np.sqrt(1 - k[2]**2)
+    psi   = np.arctan2(beta**2 * sin_T * cos_T, 1 - beta**2 * sin_T**2)
+    Ddirection = (np.sin(psi)*tx, np.sin(psi)*ty, np.cos(psi)*sign)
+    return Ddirection, Ndirection, _cross(Ddirection, Ndirection)
+
+
+def _cross(a, b):
+    return a[1]*b[2] - a[2]*b[1], a[2]*b[0] - a[0]*b[2], a[0]*b[1] - a[1]*b[0]
+
+
+register_basis("helicity",     ("k", "n", "r"),     _helicity_basis)
+register_basis("beam",         ("x", "y", "z"),     _beam_basis)
+register_basis("off_diagonal", ("d", "n", "dperp"), _off_diagonal_basis)
+register_basis("transverse",   ("t", "n", "z"),     _transverse_basis)
+
+
+def spin_basis_dtype(bases):
+
+    """ Structured dtype of spin_basis_observables: per basis a record of the cos_<axis>_p/m, then cos_phi """
+
+    return np.dtype([(name, [(f"cos_{axis}_{charge}", np.float64) for axis in SPIN_BASES[name].axes for charge in "pm"])
+                     for name in bases] + [("cos_phi", np.float64)])
+
+
+def _top_velocity(top, antitop):
+
+    """ Velocity of the top in the ttbar CoM frame, from the invariant masses """
+
+    s      = (top[3] + antitop[3])**2 - sum((top[i] + antitop[i])**2 for i in range(3))
+    m2_t   = top[3]**2 - sum(top[i]**2 for i in range(3))
+    m2_tb  = antitop[3]**2 - sum(antitop[i]**2 for i in range(3))
+    kallen = s**2 + m2_t**2 + m2_tb**2 - 2*(s*m2_t + s*m2_tb + m2_t*m2_tb)
+    return np.sqrt(np.maximum(kallen, 0)) / (s + m2_t - m2_tb)
+
+
+def spin_basis_observables(top,antitop,lepP,lepM,bases=None):
+
+    """
+    The cosines of the lepton directions (in their parent tops' frames) with
+    the axes of the registered spin bases, and cos_phi, for arrays of events
+    or single vector.obj as helicity_basis_angular_observables_array. The
+    boosts are done once, and every basis reuses the same lepton directions
+    Args:
+    - bases: names of the bases of SPIN_BASES, all by default
+    Returns a structured array of spin_basis_dtype(bases), e.g.
+    obs["helicity"]["cos_k_p"] or obs["cos_phi"]
+    """
+
+    bases   = list(SPIN_BASES) if bases is None else list(bases)
+    unknown = [name for name in bases if name not in SPIN_BASES]
+    if unknown:
+        raise ValueError(f"spin_observables: unknown spin bases {unknown}, registered: {list(SPIN_BASES)}")
+
+    top, antitop, lepP, lepM = (_components(p) for p in (top, antitop, lepP, lepM))
+    Kdirection, lepP_direction, lepM_direction = parent_top_directions(top, antitop, lepP, lepM)
+    beta = _top_velocity(top, antitop)
+
+    obs = np.empty(len(top[0]), dtype=spin_basis_dtype(bases))
+    for name in bases:
+        basis = SPIN_BASES[name]
+        for axis_name, axis in zip(basis.axes, basis.build(tuple(Kdirection), beta)):
+            obs[name][f"cos_{axis_name}_p"] =  _dot(axis, lepP_direction)
+            obs[name][f"cos_{axis_name}_m"] = -_dot(axis, lepM_direction)
+    obs["cos_phi"] = _dot(lepP_direction, lepM_direction)
+    return obs
+
+
+def spin_correlations(obs, weights=None):
+
+    """
+    Quantum-entanglement inputs from the (weighted) events of
+    spin_basis_observables: D = -3 <cos_phi>, and per basis the spin
+    correlation matrix C_ij = -9 <cos_i^+ cos_j^-> and the polarisations
+    B_i^+- = -3 <cos_i^+->, as in spin_tools.awkward_spins
+    Returns {"D": D, basis: {"C": (3, 3), "B_plus": (3,), "B_minus": (3,)}}
+    """
+
+    weights = np.ones(len(obs)) if weights is None else np.asarray(weights, dtype=np.float64)
+    sumw    = weights.sum()
+    result  = {"D": -3 * np.dot(weights, obs["cos_phi"]) / sumw}
+    for name in obs.dtype.names:
+        if name == "cos_phi":
+            continue
+        axes  = SPIN_BASES[name].axes
+        plus  = np.stack([obs[name][f"cos_{axis}_p"] for axis in axes], axis=1)
+        minus = np.stack([obs[name][f"cos_{axis}_m"] for axis in axes], axis=1)
+        result[name] = {"C"       : -9 * (plus * weights[:, None]).T @ minus / sumw,
+                        "B_plus"  : -3 * weights @ plus / sumw,
+                        "B_minus" : -3 * weights @ minus / sumw}
+    return result
 
 
 def lab_frame_cos_phi(lepP,lepM):
@@ -1,38 +1,193 @@
 import awkward as ak
-import pylhe
 import vector 
 import numpy as np
 import sys
 import time 
+import hashlib
+import json
+import math
+import multiprocessing
+from contextlib import nullcontext
 
-def parse(filename: str):
+from heptools.LHEcache import get_cache
+from heptools.LHEcolumns import EventColumns, iter_event_columns, count_events, event_ranges, HEADER_FIELDS, PARTICLE_FIELDS
+from heptools.LHEio import compression
+from heptools.ttbar_boosts import parent_top_directions
+
+vector.register_awkward()
+
+
+# Collections built by parse: name ---> PDG ids, per event the particles of
+# the first id before those of the next
+COLLECTIONS = {
+    "tops"        : (6,),
+    "anti_tops"   : (-6,),
+    "pos_leptons" : (-11, -13),
+    "neg_leptons" : (11, 13),
+}
+
+
+def parse(filename: str, cache=None, collections: dict=None, fields=("vector",), step_size: int=10000,
+          match_decays: bool=False, lepton_ids=(11, 13)):
 
     """
     Parses the LHE and generates an awkward array of the top, anti-top and
     charged leptons Momentum4D vectors
+    Args:
+    - cache: on-disk cache of the result, see heptools.LHEcache.get_cache
+      (by default used only if HEPTOOLS_CACHE_DIR is set)
+    - collections: dict of the collections to build, name ---> PDG ids,
+      COLLECTIONS by default
+    - fields: the particle fields to keep, "vector" (the Momentum4D) and/or
+      names of heptools.LHEcolumns.PARTICLE_FIELDS; with only "vector" each
+      collection is an array of Momentum4D vectors, else of records
+    - step_size: number of events tokenized at a time
+    - match_decays: instead of the collections, pick the top, anti-top and
+      the charged leptons of their W decays through the LHE mother indices
+      (see match_decays), one of each per event, as flat arrays; only the
+      events with such a decay are kept, with their position in the file in
+      the event_index field
+    - lepton_ids: the |PDG ids| of the charged leptons matched
+    Only the particles of the collections, and only the requested fields,
+    are kept from each chunk of events
     """
-    array = pylhe.to_awkward(pylhe.read_lhe_with_attributes('events.lhe'))
 
-    # Pull out the relevant particle 4-vectors
-    top            = array.particles[array.particles.id == 6] ["vector"]
-    anti_top       = array.particles[array.particles.id ==-6] ["vector"]
-    pos_elec       = array.particles[array.particles.id ==-11]["vector"]
-    neg_elec       = array.particles[array.particles.id ==11] ["vector"]
-    pos_mu         = array.particles[array.particles.id ==-13]["vector"]
-    neg_mu         = array.particles[array.particles.id ==13] ["vector"]
+    collections, fields = _selection(collections, fields)
+    options = dict(collections=collections, fields=fields, step_size=step_size, match_decays=match_decays, lepton_ids=tuple(lepton_ids))
+
+    cache = get_cache(cache)
+    if cache is not None:
+        selection = json.dumps([sorted(collections.items()), fields, match_decays, sorted(lepton_ids)]).encode()
+        tag       = "awkward_spins.parse-" + hashlib.blake2b(selection, digest_size=6).hexdigest()
+        return cache.cached(filename, tag, lambda: _parse(filename, options))
+    return _parse(filename, options)
+
+
+def _selection(collections, fields):
+
+    collections = dict(COLLECTIONS if collections is None else collections)
+    fields      = list(fields)
+    unknown     = [field for field in fields if field != "vector" and field not in PARTICLE_FIELDS]
+    if unknown:
+        raise ValueError(f"awkward_spins: unknown particle fields {unknown}, choose from {['vector', *PARTICLE_FIELDS]}")
+    return collections, fields
+
+
+def iterate(filename: str, collections: dict=None, fields=("vector",), step_size: int=10000, byte_range=None,
+            match_decays: bool=False, lepton_ids=(11, 13)):
+
+    """
+    Streams the file, or the (start, stop) byte_range of an uncompressed file
+    (see heptools.LHEcolumns.event_ranges), yielding the parse() array of
+    step_size events at a time; with match_decays the event_index field
+    counts from the start of the range
+    """
+
+    collections, fields = _selection(collections, fields)
+    position = 0
+    for events in iter_event_columns(filename, step_size, byte_range):
+        yield _events_array(events, position, collections, fields, match_decays, lepton_ids)
+        position += len(events)
+
+
+def _events_array(events, position, collections, fields, match_decays, lepton_ids):
+
+    """ The iterate() array of the EventColumns block events, starting at event number position """
+
+    eventinfo = ak.zip({field: events.header[:, i] for i, field in enumerate(HEADER_FIELDS)}, with_name="EventInfo")
+    if match_decays:
+        matched, top, anti_top, lepton_plus, lepton_minus = match_decays_indices(events, lepton_ids)
+        out = {"eventinfo"   : eventinfo[matched],
+               "event_index" : position + np.flatnonzero(matched),
+               "tops"        : _particles(events, top, fields),
+               "anti_tops"   : _particles(events, anti_top, fields),
+               "pos_leptons" : _particles(events, lepton_plus, fields),
+               "neg_leptons" : _particles(events, lepton_minus, fields)}
+    else:
+        out = {"eventinfo": eventinfo}
+        for name, ids in collections.items():
+            out[name] = _select(events, ids, fields)
+    return ak.zip(out, depth_limit=1, with_name="Event")
+
+
+def match_decays_indices(events, lepton_ids=(11, 13)):
+
+    """
+    Vectorised matching of the t -> W+ -> l+ and tbar -> W- -> l- decay chains
+    of a heptools.LHEcolumns.EventColumns block through the mother1 indices:
+    a positive (negative) lepton of |id| in lepton_ids is matched when its
+    mother is a W+ (W-) whose mother is a top (anti-top). Extra leptons (from
+    other decays, or taus) are therefore ignored.
+    Returns the mask of the events with exactly one matched lepton of each
+    charge, and for these events the indices (into the particle columns) of
+    the top, the anti-top, the positive and the negative lepton
+    """
+
+    ids    = events["id"]
+    event  = events.event_index
+
+    def mother(index):
+        # Index of the mother1 of the particles at index, -1 for none
+        local = events["mother1"][index]
+        return np.where((index >= 0) & (local > 0), events.offsets[:-1][event[index]] + local - 1, -1)
+
+    everything  = np.arange(len(ids))
+    parent      = mother(everything)
+    grandparent = np.where(parent >= 0, mother(np.maximum(parent, 0)), -1)
+    parent_id      = np.where(parent >= 0, ids[np.maximum(parent, 0)], 0)
+    grandparent_id = np.where(grandparent >= 0, ids[np.maximum(grandparent, 0)], 0)
+
+    leptons = np.isin(np.abs(ids), lepton_ids)
+    chains  = []
+    for sign in (+1, -1):
+        # l+ has a negative PDG id
+        candidates = np.flatnonzero(leptons & (ids * sign < 0) & (parent_id == 24 * sign) & (grandparent_id == 6 * sign))
+        count      = np.bincount(event[candidates], minlength=len(events))
+        chosen     = np.zeros(len(events), dtype=np.int64)
+        chosen[event[candidates]] = candidates
+        chains.append((count, chosen))
+
+    matched = (chains[0][0] == 1) & (chains[1][0] == 1)
+    lepton_plus, lepton_minus = chains[0][1][matched], chains[1][1][matched]
+    return matched, grandparent[lepton_plus], grandparent[lepton_minus], lepton_plus, lepton_minus
+
+
+def _particles(events, selected, fields):
+
+    """ The particles of events at indices selected, as a flat awkward array of fields """
+
+    columns = {}
+    for field in fields:
+        if field == "vector":
+            columns["vector"] = ak.zip({axis: events[name][selected] for axis, name in (("x", "px"), ("y", "py"), ("z", "pz"), ("t", "e"))},
+                                       with_name="Momentum4D")
+        else:
+            columns[field] = events.particles[PARTICLE_FIELDS.index(field)][selected]
+    return columns["vector"] if fields == ["vector"] else ak.zip(columns, depth_limit=1, with_name="Particle")
+
+
+def _select(events, ids, fields):
+
+    """ Per-event list of the particles of events with PDG id in ids, as a jagged awkward array of fields """
 
-    leptonP = ak.concatenate([pos_elec,pos_mu],axis=1)
-    leptonM = ak.concatenate([neg_elec,neg_mu],axis=1)
+    rank     = np.full(len(events["id"]), len(ids))
+    for i, pdgid in enumerate(ids):
+        rank[events["id"] == pdgid] = i
+    selected = np.flatnonzero(rank < len(ids))
+    event    = events.event_index[selected]
+    selected = selected[np.argsort(event * len(ids) + rank[selected], kind="stable")]
+    counts   = np.bincount(event, minlength=len(events))
+    return ak.unflatten(_particles(events, selected, fields), counts)
 
-    out = ak.zip({
-            "eventinfo": array.eventinfo,
-            "tops": top,
-            "anti_tops": anti_top,
-            "pos_leptons": leptonP,
-            "neg_leptons": leptonM
-        }, depth_limit=1, with_name="Event")
-    
-    return  out 
+
+def _parse(filename, options):
+
+    chunks = list(iterate(filename, **options))
+    if not chunks:
+        # A file without events gives an empty array with the usual fields
+        options = {name: value for name, value in options.items() if name != "step_size"}
+        return _events_array(EventColumns.from_records("", ""), 0, **options)
+    return ak.concatenate(chunks) if len(chunks) > 1 else chunks[0]
 
 
 def boost(arr: "pylhe.awkward.EventArray"):
@@ -46,24 +201,23 @@ def boost(arr: "pylhe.awkward.EventArray"):
     leptonP  = arr["pos_leptons"]
     leptonM  = arr["neg_leptons"]
 
-    # Build ttbar system
-    ttbar = top + anti_top 
-
-    # Boost tops lab --> ttbar_CoM
-    top_in_CoM      = top.boostCM_of(ttbar)
-    antitop_in_CoM  = anti_top.boostCM_of(ttbar) 
-
-    # Boost leptons lab --> ttbar_CoM --> parent_tops'_CoM
-    leptonP_in_CoM     = leptonP.boostCM_of(ttbar)
-    leptonM_in_CoM     = leptonM.boostCM_of(ttbar)
-    leptonP_in_top     = leptonP_in_CoM.boostCM_of(top_in_CoM)
-    leptonM_in_antitop = leptonM_in_CoM.boostCM_of(antitop_in_CoM)
-
-    # Compute the unit 3-vector directions
-    Kdirection        = top_in_CoM.to_beta3().unit()
-    leptonP_direction = leptonP_in_top.to_beta3().unit()
-    leptonM_direction = leptonM_in_antitop.to_beta3().unit()
-
+    # Boosts lab --> ttbar_CoM --> parent_tops'_CoM of the flattened particles,
+    # which must come one of each per event (or per entry of the event lists)
+    counts = None
+    if top.ndim > 1:
+        counts = ak.num(top)
+        if not all(ak.all(ak.num(p) == counts) for p in (anti_top, leptonP, leptonM)):
+            raise ValueError("awkward_spins: boost needs as many tops, anti-tops, positive and negative leptons in every event")
+        top, anti_top, leptonP, leptonM = (ak.flatten(p) for p in (top, anti_top, leptonP, leptonM))
+    directions = parent_top_directions(*([ak.to_numpy(getattr(p, c)) for c in ("x", "y", "z", "t")]
+                                         for p in (top, anti_top, leptonP, leptonM)))
+
+    # Unit 3-vector directions of the top, and of the leptons in their parent tops' frame
+    Kdirection, leptonP_direction, leptonM_direction = (ak.zip({"x": d[0], "y": d[1], "z": d[2]}, with_name="Vector3D")
+                                                        for d in directions)
+    if counts is not None:
+        Kdirection, leptonP_direction, leptonM_direction = (ak.unflatten(d, counts)
+                                                            for d in (Kdirection, leptonP_direction, leptonM_direction))
     return Kdirection, leptonP_direction, leptonM_direction
 
 
@@ -108,112 +262,412 @@ def helicity_basis_observables(Kdirection, leptonP_direction, leptonM_direction)
     return helicity_observables
 
 
-def compute_spin_parameters(observable_array):
+# Order of the spin-analysing cosines in the observable matrix: the k, n, r
+# components for the positive lepton, then for the negative one
+OBSERVABLES = ("cos_K_plus", "cos_N_plus", "cos_R_plus", "cos_K_minus", "cos_N_minus", "cos_R_minus")
+
+SPIN_PARAMETERS = ("Ckk", "Cnn", "Crr", "CrkP", "CrkM", "CnrP", "CnrM", "CnkP", "CknM",
+                   "BkP", "BkM", "BnP", "BnM", "BrP", "BrM")
+
+
+def _spin_transform():
+
+    """
+    (15, 15) matrix taking the means of the features, the nine products
+    cos_i^+ cos_j^- (i, j in k, n, r order) then the six OBSERVABLES, to the
+    SPIN_PARAMETERS: C_ij = -9 <cos_i^+ cos_j^->, B_i^+- = -3 <cos_i^+->
+    """
+
+    axes   = "knr"
+    C      = {"Ckk" : {"kk": 1}, "Cnn" : {"nn": 1}, "Crr" : {"rr": 1},
+              "CrkP": {"rk": 1, "kr": 1}, "CrkM": {"rk": 1, "kr": -1},
+              "CnrP": {"nr": 1, "rn": 1}, "CnrM": {"nr": 1, "rn": -1},
+              "CnkP": {"nk": 1, "kn": 1}, "CknM": {"nk": 1, "kn": -1}}
+    B      = {"BkP": "cos_K_plus", "BkM": "cos_K_minus", "BnP": "cos_N_plus",
+              "BnM": "cos_N_minus", "BrP": "cos_R_plus", "BrM": "cos_R_minus"}
+
+    transform = np.zeros((len(SPIN_PARAMETERS), 9 + len(OBSERVABLES)))
+    for row, name in enumerate(SPIN_PARAMETERS):
+        if name in C:
+            for (i, j), sign in C[name].items():
+                transform[row, 3*axes.index(i) + axes.index(j)] = -9 * sign
+        else:
+            transform[row, 9 + OBSERVABLES.index(B[name])] = -3
+    return transform
+
+SPIN_TRANSFORM = _spin_transform()
+
+
+def observable_matrix(observable_array):
+
+    """
+    Contiguous (N, 6) array of the OBSERVABLES of the first lepton pair of
+    every event, each field converted once
+    """
+
+    matrix = np.empty((len(observable_array), len(OBSERVABLES)))
+    for i, name in enumerate(OBSERVABLES):
+        matrix[:, i] = _leading(observable_array[name])
+    return matrix
+
+
+def _leading(column):
+
+    """ column[:,0] as NumPy, or the column itself if flat (as for parse(..., match_decays=True)) """
+
+    return column.to_numpy() if column.ndim == 1 else column[:,0].to_numpy()
+
+
+def _features(observables):
+
+    """
+    (N, 15) features of spin_density from an observable array or matrix:
+    the products cos_i^+ cos_j^- (i, j in k, n, r order) then the OBSERVABLES
+    """
+
+    if isinstance(observables, ak.Array):
+        observables = observable_matrix(observables)
+    observables = np.asarray(observables, dtype=np.float64)
+    features = np.empty((len(observables), 9 + len(OBSERVABLES)))
+    features[:, :9] = (observables[:, :3, None] * observables[:, None, 3:]).reshape(-1, 9)
+    features[:, 9:] = observables
+    return features
+
+
+def spin_density(observables, weights=None, covariance:bool=False):
+
+    """
+    Fused estimator of the spin parameters from an (N, 6) observable matrix:
+    all first and second moments come from a single (7, 7) matrix product of
+    the observables (plus a column of ones) with themselves
+    Args:
+    - weights: optional per-event weights
+    - covariance: also estimate the covariance of the parameters,
+      sum w^2 (x - <x>)(x - <x>)^T / (sum w)^2 for the features x
+    Returns the (15,) parameter values in SPIN_PARAMETERS order and their
+    (15, 15) covariance matrix (None unless covariance)
+    """
+
+    observables = np.asarray(observables, dtype=np.float64)
+    moments = np.empty((len(observables), len(OBSERVABLES) + 1))
+    moments[:, :-1] = observables
+    moments[:, -1]  = 1.
+    weights = None if weights is None else np.asarray(weights, dtype=np.float64)
+
+    sums  = moments.T @ (moments if weights is None else moments * weights[:, None])
+    sumw  = sums[-1, -1]
+    means = np.concatenate([sums[:3, 3:6].ravel(), sums[-1, :-1]]) / sumw
+    values = SPIN_TRANSFORM @ means
+
+    if not covariance:
+        return values, None
+
+    features  = _features(observables) - means
+    weighted = features if weights is None else features * (weights**2)[:, None]
+    return values, SPIN_TRANSFORM @ (features.T @ weighted / sumw**2) @ SPIN_TRANSFORM.T
+
+
+def compute_spin_parameters(observable_array, weights=None, uncertainties:bool=False):
 
     """
     Computes the spin parameters (C_{i,j}, B_k^{+/-})
+    Args:
+    - weights: optional per-event weights
+    - uncertainties: also return the statistical uncertainties and the
+      covariance matrix of the parameters (in SPIN_PARAMETERS order)
+    See spin_density
     """
 
-    Ckk = -9*(np.multiply(observable_array["cos_K_plus"][:,0].to_numpy() , observable_array["cos_K_minus"][:,0].to_numpy()).mean())
-    Cnn = -9*(np.multiply(observable_array["cos_N_plus"][:,0].to_numpy() , observable_array["cos_N_minus"][:,0].to_numpy()).mean())
-    Crr = -9*(np.multiply(observable_array["cos_R_plus"][:,0].to_numpy() , observable_array["cos_R_minus"][:,0].to_numpy()).mean())
-    Crk = -9*(np.multiply(observable_array["cos_R_plus"][:,0].to_numpy() , observable_array["cos_K_minus"][:,0].to_numpy()).mean())
-    Ckr = -9*(np.multiply(observable_array["cos_K_plus"][:,0].to_numpy() , observable_array["cos_R_minus"][:,0].to_numpy()).mean())
-    Cnr = -9*(np.multiply(observable_array["cos_N_plus"][:,0].to_numpy() , observable_array["cos_R_minus"][:,0].to_numpy()).mean())
-    Crn = -9*(np.multiply(observable_array["cos_R_plus"][:,0].to_numpy() , observable_array["cos_N_minus"][:,0].to_numpy()).mean())
-    Cnk = -9*(np.multiply(observable_array["cos_N_plus"][:,0].to_numpy() , observable_array["cos_K_minus"][:,0].to_numpy()).mean())
-    Ckn = -9*(np.multiply(observable_array["cos_K_plus"][:,0].to_numpy() , observable_array["cos_N_minus"][:,0].to_numpy()).mean())
-
-    CrkP = Crk + Ckr 
-    CrkM = Crk - Ckr 
-    CnrP = Cnr + Crn
-    CnrM = Cnr - Crn 
-    CnkP = Cnk + Ckn 
-    CknM = Cnk - Ckn
-
-    BkP = -3*observable_array["cos_K_plus"][:,0].to_numpy().mean()
-    BkM = -3*observable_array["cos_K_minus"][:,0].to_numpy().mean()
-    BnP = -3*observable_array["cos_N_plus"][:,0].to_numpy().mean()
-    BnM = -3*observable_array["cos_N_minus"][:,0].to_numpy().mean()
-    BrP = -3*observable_array["cos_R_plus"][:,0].to_numpy().mean()
-    BrM = -3*observable_array["cos_R_minus"][:,0].to_numpy().mean()
-
-    return {"Ckk"       : Ckk,
-            "Cnn"       : Cnn,
-            "Crr"       : Crr,
-            "CrkP"      : CrkP,
-            "CrkM"      : CrkM,
-            "CnrP"      : CnrP,
-            "CnrM"      : CnrM,
-            "CnkP"      : CnkP,
-            "CknM"      : CknM,
-            "BkP"       : BkP,
-            "BkM"       : BkM,
-            "BnP"       : BnP,
-            "BnM"       : BnM,
-            "BrP"       : BrP,
-            "BrM"       : BrM}
-
-
-def histograms(observable_array, Nbins:int=10 ):
+    values, cov = spin_density(observable_matrix(observable_array), weights, covariance=uncertainties)
+    parameters = dict(zip(SPIN_PARAMETERS, values))
+    if not uncertainties:
+        return parameters
+    return parameters, dict(zip(SPIN_PARAMETERS, np.sqrt(np.diag(cov)))), cov
+
+
+class SpinAccumulator:
+
+    """
+    Running sums from which the spin parameters and their covariance are
+    computed, filled chunk by chunk and merged with +, so events of many
+    chunks, files or processes are never held together:
+        sum w, sum w^2, sum w x, sum w^2 x, sum w^2 x x^T
+    for the 15 features x of spin_density (the products cos_i^+ cos_j^-
+    and the six OBSERVABLES)
+    """
+
+    def __init__(self):
+        nfeatures    = 9 + len(OBSERVABLES)
+        self.sumw    = 0.
+        self.sumw2   = 0.
+        self.sumwx   = np.zeros(nfeatures)
+        self.sumw2x  = np.zeros(nfeatures)
+        self.sumw2xx = np.zeros((nfeatures, nfeatures))
+
+    def fill(self, observables, weights=None):
+
+        """
+        Adds the events of observables, an observable array of
+        helicity_basis_observables or an (N, 6) observable matrix, with
+        optional per-event weights
+        """
+
+        features = _features(observables)
+        weights  = np.ones(len(features)) if weights is None else np.asarray(weights, dtype=np.float64)
+        weights2 = weights**2
+
+        self.sumw    += weights.sum()
+        self.sumw2   += weights2.sum()
+        self.sumwx   += weights @ features
+        self.sumw2x  += weights2 @ features
+        self.sumw2xx += features.T @ (features * weights2[:, None])
+        return self
+
+    def __add__(self, other):
+        merged = SpinAccumulator()
+        for name in vars(merged):
+            setattr(merged, name, getattr(self, name) + getattr(other, name))
+        return merged
+
+    def __radd__(self, other):
+        # sum() starts from 0
+        return self if other == 0 else self + other
+
+    def finalize(self):
+
+        """
+        The spin parameters, their statistical uncertainties and their
+        covariance matrix, as compute_spin_parameters(..., uncertainties=True)
+        up to the order of the summations
+        """
+
+        means = self.sumwx / self.sumw
+        # sum w^2 (x - <x>)(x - <x>)^T expanded in terms of the running sums
+        spread = (self.sumw2xx - np.outer(means, self.sumw2x) - np.outer(self.sumw2x, means)
+                  + self.sumw2 * np.outer(means, means))
+        values = SPIN_TRANSFORM @ means
+        cov    = SPIN_TRANSFORM @ (spread / self.sumw**2) @ SPIN_TRANSFORM.T
+        return dict(zip(SPIN_PARAMETERS, values)), dict(zip(SPIN_PARAMETERS, np.sqrt(np.diag(cov)))), cov
+
+
+def accumulate(filename: str, step_size: int=10000, weighted: bool=False, match_decays: bool=False):
+
+    """
+    SpinAccumulator of the events of filename, streamed step_size at a time;
+    with weighted, the events are weighted by their LHE event weight, with
+    match_decays, only the events with matched decays are used (see parse).
+    Files can be processed in parallel and the results summed, e.g.
+        sum(multiprocessing.Pool().map(accumulate, files)).finalize()
+    """
+
+    accumulator = SpinAccumulator()
+    for events in iterate(filename, step_size=step_size, match_decays=match_decays):
+        observables = helicity_basis_observables(*boost(events))
+        accumulator.fill(observables, events.eventinfo.weight.to_numpy() if weighted else None)
+    return accumulator
+
+
+# Cumulative distribution of a Poisson(1) variable, up to 19
+POISSON_CDF = np.cumsum([np.exp(-1.) / math.factorial(k) for k in range(20)])
+
+
+def _mix(x):
+
+    """ splitmix64 finaliser of uint64 array x (wrapping arithmetic) """
+
+    with np.errstate(over="ignore"):
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return x ^ (x >> np.uint64(31))
+
+
+def replica_weights(event_numbers, nreplicas: int, seed: int=0):
+
+    """
+    (N, nreplicas) Poisson(1) bootstrap weights of the events numbered
+    event_numbers. Each weight is a hash of (seed, event number, replica
+    index) only, so an event gets the same weights however the events are
+    split into chunks, files or processes
+    """
+
+    events   = _mix(np.asarray(event_numbers, dtype=np.uint64) ^ _mix(np.uint64(seed)))
+    replicas = np.arange(nreplicas, dtype=np.uint64) * np.uint64(0x9e3779b97f4a7c15)
+    uniform  = (_mix(events[:, None] + replicas) >> np.uint64(11)) * 2.**-53
+    return np.searchsorted(POISSON_CDF, uniform, side="right").astype(np.float64)
+
+
+class BootstrapAccumulator:
+
+    """
+    Poisson bootstrap of the spin parameters: sum w and sum w x of the
+    spin_density features for each of nreplicas replicas, with the replica
+    weights of replica_weights, filled for all replicas in one matrix
+    product per chunk and merged with +
+    """
+
+    def __init__(self, nreplicas: int=100, seed: int=0):
+        self.nreplicas = nreplicas
+        self.seed      = seed
+        self.sumw      = np.zeros(nreplicas)
+        self.sumwx     = np.zeros((nreplicas, 9 + len(OBSERVABLES)))
+
+    def fill(self, observables, event_numbers, weights=None):
+
+        """
+        Adds the events of observables (an observable array or matrix)
+        numbered event_numbers, with optional per-event weights
+        """
+
+        features = _features(observables)
+        replicas = replica_weights(event_numbers, self.nreplicas, self.seed)
+        if weights is not None:
+            replicas *= np.asarray(weights, dtype=np.float64)[:, None]
+        self.sumw  += replicas.sum(axis=0)
+        self.sumwx += replicas.T @ features
+        return self
+
+    def __add__(self, other):
+        if (self.nreplicas, self.seed) != (other.nreplicas, other.seed):
+            raise ValueError("awkward_spins: cannot merge bootstraps with different replicas")
+        merged = BootstrapAccumulator(self.nreplicas, self.seed)
+        merged.sumw, merged.sumwx = self.sumw + other.sumw, self.sumwx + other.sumwx
+        return merged
+
+    def __radd__(self, other):
+        return self if other == 0 else self + other
+
+    def finalize(self):
+
+        """
+        Dictionary of the (nreplicas, 15) replica values of the spin
+        parameters, their standard deviations over the replicas and their
+        (15, 15) correlation matrix, in SPIN_PARAMETERS order
+        """
+
+        values = (self.sumwx / self.sumw[:, None]) @ SPIN_TRANSFORM.T
+        return {"replicas"    : values,
+                "std"         : dict(zip(SPIN_PARAMETERS, values.std(axis=0, ddof=1))),
+                "correlation" : np.corrcoef(values, rowvar=False)}
+
+
+def _bootstrap_task(task):
+
+    """ Worker: BootstrapAccumulator of one file or byte range, its events numbered from first """
+
+    filename, byte_range, first, nreplicas, seed, step_size, weighted, match_decays = task
+    accumulator = BootstrapAccumulator(nreplicas, seed)
+    for events in iterate(filename, step_size=step_size, byte_range=byte_range, match_decays=match_decays):
+        observables = helicity_basis_observables(*boost(events))
+        if match_decays:
+            numbers = first + events.event_index.to_numpy()
+        else:
+            numbers = np.arange(first, first + len(events))
+            first  += len(events)
+        accumulator.fill(observables, numbers, events.eventinfo.weight.to_numpy() if weighted else None)
+    return accumulator
+
+
+def bootstrap(filenames, nreplicas: int=100, seed: int=0, processes: int=1, step_size: int=10000, weighted: bool=False,
+              match_decays: bool=False):
+
+    """
+    Poisson bootstrap of the spin parameters over the events of filenames
+    (one file name or a list), numbered consecutively across the files
+    Args:
+    - nreplicas, seed: see replica_weights
+    - processes: number of worker processes; uncompressed files are split
+      into that many byte ranges, and the result does not depend on it (up
+      to the order of the summations)
+    - weighted: weight the events by their LHE event weight
+    - match_decays: use only the events with matched decays (see parse),
+      keeping the numbers of all the events
+    Returns BootstrapAccumulator.finalize()
+    """
+
+    filenames = [filenames] if isinstance(filenames, str) else list(filenames)
+    if processes <= 1:
+        tasks = [(filename, None) for filename in filenames]
+    else:
+        tasks = [(filename, byte_range) for filename in filenames
+                 for byte_range in (event_ranges(filename, processes) if compression(filename) is None else [None])]
+
+    with multiprocessing.Pool(processes) if processes > 1 else nullcontext() as pool:
+        mapper = pool.map if pool is not None else map
+        # Number of the first event of each task
+        counts = list(mapper(_count_task, tasks)) if len(tasks) > 1 else [0]
+        firsts = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(int)
+        tasks  = [(filename, byte_range, first, nreplicas, seed, step_size, weighted, match_decays)
+                  for (filename, byte_range), first in zip(tasks, firsts)]
+        return sum(mapper(_bootstrap_task, tasks)).finalize()
+
+
+def _count_task(task):
+    return count_events(*task)
+
+
+# Quantities histogrammed by histograms(): for the C parameters the products
+# cos_i^+ cos_j^- (their sum or difference for the off-diagonal ones), for
+# the B parameters the cosines, and cos_phi
+HISTOGRAMS = SPIN_PARAMETERS + ("cos_phi",)
+
+_HISTOGRAM_TRANSFORM = SPIN_TRANSFORM / -np.abs(SPIN_TRANSFORM).max(axis=1, keepdims=True)
+
+
+def histogram_values(observable_array):
+
+    """ (N, 16) array of the HISTOGRAMS quantities of every event """
+
+    observables = np.asfortranarray(observable_matrix(observable_array))
+    values      = np.empty((len(observables), len(HISTOGRAMS)), order="F")
+
+    def feature(i):
+        return observables[:, i // 3] * observables[:, 3 + i % 3] if i < 9 else observables[:, i - 9]
+
+    # Each quantity is one feature, or the sum or difference of two
+    for row, coefficients in enumerate(_HISTOGRAM_TRANSFORM):
+        terms = [coefficients[i] * feature(i) for i in np.flatnonzero(coefficients)]
+        values[:, row] = terms[0] if len(terms) == 1 else terms[0] + terms[1]
+    values[:, -1] = _leading(observable_array["cos_phi"])
+    return values
+
+
+def histograms(observable_array, Nbins:int=10, weights=None, threads:int=None, as_dict:bool=True):
 
     """
     Use the cosvariable arrays to build the relevant angular observable
     histograms
+    All the HISTOGRAMS quantities, computed once into a matrix, are filled
+    into a single histogram with an Integer axis of the quantity (its index
+    in HISTOGRAMS, used as a category axis, which boost-histogram fills
+    faster than an IntCategory) and a Regular axis, with weight storage
     Args:
-    - Observable_array: awkward-array of the cos-variables
+    - Observable_array: awkward-array of the cos-variables, or the
+      histogram_values matrix computed from it
     - Nbins: integer defining the binning (optional)
+    - weights: optional per-event weights
+    - threads: number of threads filling the histogram (optional)
+    - as_dict: return the dict of one histogram per quantity (the default),
+      see histogram_dict, rather than the single histogram
     """
 
     import boost_histogram as bh
 
-    DH = {  "Ckk"       : bh.Histogram(bh.axis.Regular(Nbins, -1, +1)),
-            "Cnn"       : bh.Histogram(bh.axis.Regular(Nbins, -1, +1)),
-            "Crr"       : bh.Histogram(bh.axis.Regular(Nbins, -1, +1)),
-            "CrkP"      : bh.Histogram(bh.axis.Regular(Nbins, -1, +1)),
-            "CrkM"      : bh.Histogram(bh.axis.Regular(Nbins, -1, +1)),
-            "CnrP"      : bh.Histogram(bh.axis.Regular(Nbins, -1, +1)),
-            "CnrM"      : bh.Histogram(bh.axis.Regular(Nbins, -1, +1)),
-            "CnkP"      : bh.Histogram(bh.axis.Regular(Nbins, -1, +1)),
-            "CknM"      : bh.Histogram(bh.axis.Regular(Nbins, -1, +1)),
-            "BkP"       : bh.Histogram(bh.axis.Regular(Nbins, -1, +1)),
-            "BkM"       : bh.Histogram(bh.axis.Regular(Nbins, -1, +1)),
-            "BnP"       : bh.Histogram(bh.axis.Regular(Nbins, -1, +1)),
-            "BnM"       : bh.Histogram(bh.axis.Regular(Nbins, -1, +1)),
-            "BrP"       : bh.Histogram(bh.axis.Regular(Nbins, -1, +1)),
-            "BrM"       : bh.Histogram(bh.axis.Regular(Nbins, -1, +1)),
-            "cos_phi"   : bh.Histogram(bh.axis.Regular(Nbins, -1, +1))
-    }
-
-    # Diagonal terms
-    DH["Ckk"].fill(np.multiply(observable_array["cos_K_plus"][:,0].to_numpy() , observable_array["cos_K_minus"][:,0].to_numpy()))
-    DH["Cnn"].fill(np.multiply(observable_array["cos_N_plus"][:,0].to_numpy() , observable_array["cos_N_minus"][:,0].to_numpy()))
-    DH["Crr"].fill(np.multiply(observable_array["cos_R_plus"][:,0].to_numpy() , observable_array["cos_R_minus"][:,0].to_numpy()))
-
-    # Cross-terms
-    Crk = np.multiply(observable_array["cos_R_plus"][:,0].to_numpy() , observable_array["cos_K_minus"][:,0].to_numpy())
-    Ckr = np.multiply(observable_array["cos_K_plus"][:,0].to_numpy() , observable_array["cos_R_minus"][:,0].to_numpy())
-    Cnr = np.multiply(observable_array["cos_N_plus"][:,0].to_numpy() , observable_array["cos_R_minus"][:,0].to_numpy())
-    Crn = np.multiply(observable_array["cos_R_plus"][:,0].to_numpy() , observable_array["cos_N_minus"][:,0].to_numpy())
-    Cnk = np.multiply(observable_array["cos_N_plus"][:,0].to_numpy() , observable_array["cos_K_minus"][:,0].to_numpy())
-    Ckn = np.multiply(observable_array["cos_K_plus"][:,0].to_numpy() , observable_array["cos_N_minus"][:,0].to_numpy())
-
-    DH["CrkP"].fill(np.add(Crk,Ckr))
-    DH["CrkM"].fill(np.add(Crk,-Ckr))
-    DH["CnrP"].fill(np.add(Cnr,Crn))
-    DH["CnrM"].fill(np.add(Cnr,-Crn))
-    DH["CnkP"].fill(np.add(Cnk,Ckn))
-    DH["CknM"].fill(np.add(Cnk,-Ckn))
-
-    # Polarisations
-    DH["BkP"].fill(observable_array["cos_K_plus"][:,0].to_numpy())
-    DH["BkM"].fill(observable_array["cos_K_minus"][:,0].to_numpy())
-    DH["BnP"].fill(observable_array["cos_N_plus"][:,0].to_numpy())
-    DH["BnM"].fill(observable_array["cos_N_minus"][:,0].to_numpy())
-    DH["BrP"].fill(observable_array["cos_R_plus"][:,0].to_numpy())
-    DH["BrM"].fill(observable_array["cos_R_minus"][:,0].to_numpy())
-
-    DH["cos_phi"].fill(observable_array["cos_phi"][:,0].to_numpy())
-
-    return DH
+    values = observable_array if isinstance(observable_array, np.ndarray) else histogram_values(observable_array)
+    hist   = bh.Histogram(bh.axis.Integer(0, len(HISTOGRAMS), underflow=False, overflow=False),
+                          bh.axis.Regular(Nbins, -1, +1), storage=bh.storage.Weight())
+
+    # One fill per quantity with a scalar category is about twice as fast as
+    # a single fill with a category array of N * 16 entries
+    values = np.asfortranarray(values)
+    weight = None if weights is None else np.asarray(weights, dtype=np.float64)
+    for i in range(len(HISTOGRAMS)):
+        hist.fill(i, values[:, i], weight=weight, threads=threads)
+
+    return histogram_dict(hist) if as_dict else hist
+
+
+def histogram_dict(hist):
+
+    """ Dict of the one-dimensional histogram of each HISTOGRAMS quantity in the single histogram hist """
 
+    return {name: hist[i, :] for i, name in enumerate(HISTOGRAMS)}
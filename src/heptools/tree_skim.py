@@ -5,6 +5,8 @@
 
 from ROOT import TTree, TFile, vector, gROOT, TLorentzVector
 
+from heptools.root_branches import ScalarBranch
+
 
 import sys
 
@@ -20,9 +22,9 @@ def ResetBranches(dictionary):
 		dictionary[key].resize(0)
 
 
-def BookBranch(name, suffix, tree):
+def BookBranch(name, suffix, tree, scalar=False):
 
-    """ Function to book branches to an output TTree """
+    """ Function to book branches to an output TTree, as a scalar leaf if scalar else a vector """
 
     branch_type = 'null'
     if "F" in suffix:
@@ -32,6 +34,8 @@ def BookBranch(name, suffix, tree):
     else:
         print("WARNING: Type not recognised",suffix)
 
+    if scalar:
+        return ScalarBranch(name, branch_type, tree)
     branch = vector(branch_type)(20)
     tree.Branch(name, branch)
     return branch
@@ -54,7 +58,7 @@ def skim_tree(input_tree,branches2keep):
     # Store branches here
     branch_dict = {} 
     for branch in branches2keep:
-        branch_dict[branch[0]] = BookBranch(branch[0], branch[1], output_tree)        
+        branch_dict[branch[0]] = BookBranch(branch[0], branch[1], output_tree, scalar="V" not in branch[1])
 
     total_events = input_tree.GetEntries()
 
@@ -0,0 +1,182 @@
+'''
+Columnar skimming of TTrees with uproot.
+
+columnar_skim reads only the kept branches of the input tree, step_size at
+a time with uproot.iterate, and writes the chunks as they are to a new
+TTree with uproot.recreate: branch types are preserved (integer and
+floating-point leaves of any width, jagged branches as jagged arrays with
+their counter branch n<name>), and no Python code runs per entry.
+skimming.generic_tree_skim uses it for PyROOT trees and chains.
+
+Entries can also be selected while skimming with an expression over the
+branches, e.g. "(njets >= 4) & (ak.firsts(lep_pt) > 25e3)", evaluated on
+whole chunks as awkward/NumPy arrays (the names ak and np are available).
+Its top-level & terms are applied as successive cuts, each only to the
+entries passing the previous ones, and counted into a cutflow. Only the
+branches of the selection are read for every chunk; the other kept
+branches are read for the chunks with passing entries.
+'''
+
+import ast
+from collections import OrderedDict
+
+import awkward as ak
+import numpy as np
+import uproot
+
+
+def counter_name(branch):
+
+    """ Name of the counter branch written by uproot for the jagged branch """
+
+    return "n" + branch
+
+
+def selection_cuts(selection):
+
+    """
+    The successive cuts of a selection: the top-level & terms of an
+    expression, or the expressions of a list
+    """
+
+    if selection is None:
+        return []
+    if not isinstance(selection, str):
+        return [cut for expression in selection for cut in selection_cuts(expression)]
+    selection = selection.strip()
+
+    def terms(node):
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitAnd):
+            return terms(node.left) + terms(node.right)
+        return [ast.get_source_segment(selection, node).strip()]
+
+    return terms(ast.parse(selection, mode="eval").body)
+
+
+def cut_branches(cut, branches):
+
+    """ The branches, of the names branches, used by the expression cut """
+
+    names = {node.id for node in ast.walk(ast.parse(cut, mode="eval")) if isinstance(node, ast.Name)}
+    return [branch for branch in branches if branch in names]
+
+
+class _Columns(dict):
+
+    """ Branches of the entries of a chunk passing the previous cuts, sliced on first use """
+
+    def __init__(self, chunk, passing):
+        super().__init__()
+        self.chunk   = chunk
+        self.passing = passing
+
+    def __missing__(self, name):
+        if name not in self.chunk.fields:
+            raise KeyError(name)
+        self[name] = self.chunk[name][self.passing]
+        return self[name]
+
+
+def _cut_mask(cut, columns, length):
+
+    """ Boolean NumPy mask of the expression cut, missing values failing it """
+
+    mask = eval(cut, {"ak": ak, "np": np}, columns)
+    if isinstance(mask, ak.Array):
+        mask = ak.fill_none(mask, False)
+        if mask.ndim != 1:
+            raise ValueError(f"uproot_skim: the cut {cut} gives {mask.type}, not one boolean per entry")
+        mask = ak.to_numpy(mask)
+    return np.broadcast_to(np.asarray(mask, dtype=bool), (length,))
+
+
+def print_cutflow(cutflow):
+
+    """ Prints the entries passing each cut, with the efficiencies relative to the previous cut and to all entries """
+
+    width = max(len(cut) for cut in cutflow)
+    total = previous = next(iter(cutflow.values()))
+    print(f"{'Cut':<{width}}  {'Entries':>10}  {'Rel. eff.':>9}  {'Eff.':>7}")
+    for cut, entries in cutflow.items():
+        relative = entries / previous if previous else 0.
+        absolute = entries / total if total else 0.
+        print(f"{cut:<{width}}  {entries:>10}  {relative:>9.2%}  {absolute:>7.2%}")
+        previous = entries
+
+
+def columnar_skim(files, tree_name, branches2keep, file_name=None, output_tree_name=None, cut_off=None,
+                  step_size="100 MB", selection=None):
+
+    """
+    Args:
+    - files: input ROOT file, or list of files read one after the other as a TChain
+    - tree_name: path of the tree in the input files
+    - branches2keep: names of the branches copied to the output
+    - file_name: output file, <output_tree_name>.root by default
+    - output_tree_name: name of the output tree, <tree_name>_skimmed by default
+    - cut_off: maximum number of entries read
+    - step_size: entries read per chunk, a number or a size such as "100 MB"
+      (of the selection branches, if any)
+    - selection: expression, or list of expressions, over the branches
+      selecting the entries copied, see selection_cuts
+    Returns the cutflow, an ordered dict of the number of entries read then
+    passing each cut, the last being the number written; it is printed at
+    the end if there is a selection
+    """
+
+    files            = [files] if isinstance(files, str) else list(files)
+    output_tree_name = output_tree_name or tree_name.split("/")[-1] + "_skimmed"
+    file_name        = file_name or output_tree_name + ".root"
+
+    total = 0
+    for input_file in files:
+        with uproot.open({input_file: tree_name}) as tree:
+            total += tree.num_entries
+            if input_file == files[0]:
+                types    = tree.arrays(branches2keep, entry_stop=0, library="ak")
+                branches = tree.keys()
+    if cut_off is not None:
+        total = min(total, cut_off)
+
+    # A kept counter of another kept jagged branch is written by uproot itself
+    jagged   = [branch for branch in branches2keep if types[branch].ndim > 1]
+    counters = {counter_name(branch) for branch in jagged}
+    written  = [branch for branch in branches2keep if branch not in counters]
+
+    # Branches read for every chunk, and those read only for chunks with selected entries
+    cuts     = selection_cuts(selection)
+    selected = list(OrderedDict.fromkeys(branch for cut in cuts for branch in cut_branches(cut, branches)))
+    iterated = selected or written
+    deferred = [branch for branch in written if branch not in iterated]
+    cutflow  = OrderedDict([("All entries", 0)] + [(cut, 0) for cut in cuts])
+
+    entries = 0
+    with uproot.recreate(file_name) as output_file:
+        output_tree = output_file.mktree(output_tree_name, {branch: types[branch].type.content for branch in written},
+                                         counter_name=counter_name)
+        if total > 0:
+            for chunk, report in uproot.iterate([{input_file: tree_name} for input_file in files],
+                                                iterated, step_size=step_size,
+                                                library="ak", report=True):
+                chunk = chunk[:total - entries]
+                entries += len(chunk)
+                cutflow["All entries"] += len(chunk)
+
+                passing = np.arange(len(chunk))
+                for cut in cuts:
+                    passing = passing[_cut_mask(cut, _Columns(chunk, passing), len(passing))]
+                    cutflow[cut] += len(passing)
+
+                if not cuts:
+                    output_tree.extend({branch: chunk[branch] for branch in written})
+                elif len(passing) > 0:
+                    start = report.tree_entry_start
+                    rest  = report.tree.arrays(deferred, entry_start=start, entry_stop=start + len(chunk), library="ak") if deferred else chunk
+                    output_tree.extend({branch: (rest if branch in deferred else chunk)[branch][passing] for branch in written})
+                print("Event", entries, "/", total)
+                if entries == total:
+                    break
+
+    if cuts:
+        print_cutflow(cutflow)
+    return cutflow
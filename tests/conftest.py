@@ -0,0 +1,95 @@
+'''
+Shared fixtures: small synthetic LHE files of dileptonic ttbar events,
+t -> W+ b -> l+ nu b and tbar -> W- bbar -> l- nubar bbar, each lepton an
+electron or a muon at random, with <rwgt> weights, written plain and
+gzip/xz-compressed.
+'''
+
+import gzip
+import lzma
+
+import numpy as np
+import pytest
+
+
+def _boost(p, beta):
+    b2 = beta @ beta
+    if b2 == 0:
+        return p
+    gamma = 1 / np.sqrt(1 - b2)
+    bp    = beta @ p[:3]
+    out   = np.empty(4)
+    out[:3] = p[:3] + ((gamma - 1) * bp / b2 + gamma * p[3]) * beta
+    out[3]  = gamma * (p[3] + bp)
+    return out
+
+
+def _two_body(rng, parent, m1, m2):
+
+    """ Isotropic decay of parent (px, py, pz, E) into masses m1, m2 """
+
+    mass  = np.sqrt(parent[3]**2 - parent[:3] @ parent[:3])
+    p     = np.sqrt((mass**2 - (m1 + m2)**2) * (mass**2 - (m1 - m2)**2)) / (2 * mass)
+    cos   = rng.uniform(-1, 1)
+    phi   = rng.uniform(0, 2 * np.pi)
+    axis  = np.array([np.sqrt(1 - cos**2) * np.cos(phi), np.sqrt(1 - cos**2) * np.sin(phi), cos])
+    beta  = parent[:3] / parent[3]
+    first = _boost(np.append(p * axis, np.sqrt(p**2 + m1**2)), beta)
+    return first, parent - first
+
+
+def lhe_text(nevents, nweights=2, seed=1):
+
+    """ LHE file contents of nevents ttbar events """
+
+    rng   = np.random.default_rng(seed)
+    lines = ['<LesHouchesEvents version="3.0">', "<header>", "<initrwgt>", '<weightgroup name="scale">']
+    lines += [f"<weight id='rwgt_{k + 1}'> mur={k} </weight>" for k in range(nweights)]
+    lines += ["</weightgroup>", "</initrwgt>", "</header>", "<init>",
+              "2212 2212 6.5e3 6.5e3 0 0 247000 247000 -4 1", "5.0e2 1.0e0 5.0e2 1", "</init>"]
+
+    def particle(pid, status, mother, colour, p, mass, spin):
+        return (f" {pid:>8d} {status:>2d} {mother[0]:>4d} {mother[1]:>4d} {colour[0]:>4d} {colour[1]:>4d}"
+                f" {p[0]:+.10e} {p[1]:+.10e} {p[2]:+.10e} {p[3]:.10e} {mass:.10e} 0.0000e+00 {spin:.4e}")
+
+    for _ in range(nevents):
+        shat = rng.uniform(400, 1000)
+        pz   = rng.normal(0, 300)
+        x1   = (np.sqrt(pz**2 + shat**2) + pz) / 2
+        x2   = x1 - pz
+        g1, g2 = np.array([0, 0, x1, x1]), np.array([0, 0, -x2, x2])
+        top, antitop = _two_body(rng, g1 + g2, 172.5, 172.5)
+        wp, b        = _two_body(rng, top, 80.4, 4.7)
+        wm, bb       = _two_body(rng, antitop, 80.4, 4.7)
+        (lp, mp), (lm, mm) = [((11, 0.000511), (13, 0.105))[k] for k in rng.integers(2, size=2)]
+        lplus, nu    = _two_body(rng, wp, mp, 0.)
+        lminus, nubar = _two_body(rng, wm, mm, 0.)
+        particles = [particle(21, -1, (0, 0), (501, 0), g1, 0., 1.), particle(21, -1, (0, 0), (502, 0), g2, 0., -1.),
+                     particle(6, 2, (1, 2), (501, 0), top, 172.5, 0.), particle(-6, 2, (1, 2), (0, 502), antitop, 172.5, 0.),
+                     particle(24, 2, (3, 3), (0, 0), wp, 80.4, 0.), particle(5, 1, (3, 3), (501, 0), b, 4.7, -1.),
+                     particle(-24, 2, (4, 4), (0, 0), wm, 80.4, 0.), particle(-5, 1, (4, 4), (0, 502), bb, 4.7, 1.),
+                     particle(-lp, 1, (5, 5), (0, 0), lplus, mp, 1.), particle(lp + 1, 1, (5, 5), (0, 0), nu, 0., -1.),
+                     particle(lm, 1, (7, 7), (0, 0), lminus, mm, -1.), particle(-lm - 1, 1, (7, 7), (0, 0), nubar, 0., 1.)]
+        weight = rng.normal(1, .1)
+        lines += ["<event>", f" {len(particles)} 1 {weight:+.7e} {np.sqrt(shat):.8e} 7.54677100e-03 1.18000000e-01"]
+        lines += particles
+        lines += ["<rwgt>"] + [f"<wgt id='rwgt_{k + 1}'> {weight * (1 + 0.1 * k):+.7e} </wgt>" for k in range(nweights)]
+        lines += ["</rwgt>", "</event>"]
+    lines.append("</LesHouchesEvents>")
+    return "\n".join(lines) + "\n"
+
+
+@pytest.fixture(scope="session")
+def lhe_files(tmp_path_factory):
+
+    """ Paths of the same 200-event sample: plain, .gz and .xz """
+
+    directory = tmp_path_factory.mktemp("lhe")
+    text      = lhe_text(200).encode()
+    paths     = {"plain": directory / "events.lhe", "gz": directory / "events.lhe.gz", "xz": directory / "events.lhe.xz"}
+    paths["plain"].write_bytes(text)
+    with gzip.open(paths["gz"], "wb") as f:
+        f.write(text)
+    with lzma.open(paths["xz"], "wb") as f:
+        f.write(text)
+    return {name: str(path) for name, path in paths.items()}
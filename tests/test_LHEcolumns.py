@@ -0,0 +1,70 @@
+import re
+
+import numpy as np
+import pytest
+from conftest import lhe_text
+
+from heptools.LHEcolumns import _event_buffers, count_events, event_ranges, read_event_columns, iter_event_columns, weight_ids
+from heptools.root_branches import UNDEFINED
+
+
+@pytest.mark.parametrize("kind", ["gz", "xz"])
+@pytest.mark.parametrize("block_size", [100, 1500, 1 << 24])
+def test_compressed_blocks_hold_whole_events(lhe_files, kind, block_size):
+    # Blocks smaller than an event must be carried over, not cut
+    raw     = open(lhe_files["plain"], "rb").read()
+    buffers = [bytes(buffer[start:stop]) for buffer, start, stop in _event_buffers(lhe_files[kind], block_size=block_size)]
+    assert b"".join(buffers) == raw
+    for buffer in buffers[:-1]:
+        assert buffer.endswith(b"</event>")
+
+
+@pytest.mark.parametrize("kind", ["gz", "xz"])
+def test_compressed_columns_match_plain(lhe_files, kind):
+    plain, compressed = read_event_columns(lhe_files["plain"]), read_event_columns(lhe_files[kind])
+    assert np.array_equal(plain.header, compressed.header)
+    assert np.array_equal(plain.offsets, compressed.offsets)
+    assert np.array_equal(plain.particles, compressed.particles)
+    assert count_events(lhe_files[kind]) == 200
+
+
+def test_event_ranges_cover_every_event(lhe_files):
+    ranges = event_ranges(lhe_files["plain"], 3)
+    assert len(ranges) == 3
+    assert sum(len(events) for byte_range in ranges for events in iter_event_columns(lhe_files["plain"], 64, byte_range)) == 200
+
+
+def test_event_ranges_without_a_complete_event(tmp_path):
+    path = tmp_path / "truncated.lhe"
+    path.write_bytes(b"<LesHouchesEvents>\n<init>\n</init>\n<event>\n 1 1 1.0 1.0 1.0 1.0\n")
+    assert event_ranges(str(path), 2) == []
+
+
+@pytest.mark.parametrize("kind", ["plain", "gz"])
+def test_columns_match_pylhe(lhe_files, kind):
+    pylhe = pytest.importorskip("pylhe")
+    reference = pylhe.to_awkward(pylhe.read_lhe_with_attributes(lhe_files[kind]))
+    columns   = read_event_columns(lhe_files[kind], weights=True)
+    assert len(columns) == len(reference) == 200
+    assert columns.to_awkward().to_list() == reference.to_list()
+    weights = [event.weights for event in pylhe.read_lhe_with_attributes(lhe_files[kind])]
+    assert weight_ids(lhe_files[kind]) == list(weights[0])
+    assert np.allclose(columns.weights, [list(event.values()) for event in weights], rtol=1e-7)
+
+
+@pytest.mark.parametrize("chunk_size", [3, 64])
+def test_events_without_weights(tmp_path, chunk_size):
+    # Events without <rwgt> get UNDEFINED weights, as in the legacy parser, even in chunks with none
+    text    = lhe_text(30)
+    missing = np.array([i < 3 or i % 3 == 0 for i in range(30)])
+    events  = text.split("<event>")
+    for i in np.flatnonzero(missing):
+        events[i + 1] = re.sub(r"<rwgt>.*</rwgt>\n", "", events[i + 1], flags=re.S)
+    full, mixed = tmp_path / "full.lhe", tmp_path / "mixed.lhe"
+    full.write_text(text)
+    mixed.write_text("<event>".join(events))
+
+    weights = np.concatenate([block.weights for block in iter_event_columns(str(mixed), chunk_size, weights=True)])
+    assert weights.shape == (30, 2)
+    assert np.all(weights[missing] == UNDEFINED)
+    assert np.array_equal(weights[~missing], read_event_columns(str(full), weights=True).weights[~missing])
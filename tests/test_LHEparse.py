@@ -0,0 +1,37 @@
+import awkward as ak
+import numpy as np
+import pytest
+
+from heptools.LHEparse import LHEparse
+
+
+@pytest.fixture(scope="module")
+def events(lhe_files):
+    return LHEparse(lhe_files["plain"], backend="numpy").build()
+
+
+def test_composite_concatenates_members_in_order(events):
+    positive = ak.concatenate([events.anti_electron, events.anti_muon], axis=1)
+    assert ak.all(ak.num(events.positive_leptons) == 1)
+    assert ak.to_list(events.positive_leptons.id) == ak.to_list(positive.id)
+    assert ak.to_list(events["negative_leptons"].vector.x) == ak.to_list(ak.concatenate([events.electron, events.muon], axis=1).vector.x)
+
+
+@pytest.mark.parametrize("selection", ["mask", "index"])
+def test_composite_after_selection(events, selection):
+    # The layout of a selected array is indexed, the composites are built from its fields
+    where    = np.asarray(ak.num(events.anti_muon) > 0) if selection == "mask" else np.arange(len(events))[::-3]
+    selected = events[where]
+    assert len(selected) > 0
+    for name in ("positive_leptons", "negative_leptons", "up_type_quarks", "anti_down_type_quarks"):
+        assert ak.to_list(selected[name]) == ak.to_list(events[name][where])
+    leptons  = ak.flatten(selected.positive_leptons)
+    assert np.allclose(leptons.vector.mass, leptons.m, atol=1e-2)
+
+
+def test_backends_build_the_same_events(lhe_files, events):
+    pytest.importorskip("pylhe")
+    reference = LHEparse(lhe_files["plain"], backend="pylhe").build()
+    assert reference.fields == events.fields
+    for name in events.fields + list(LHEparse.COMPOSITES):
+        assert ak.to_list(events[name]) == ak.to_list(reference[name])
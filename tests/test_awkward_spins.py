@@ -0,0 +1,69 @@
+import awkward as ak
+import numpy as np
+import pytest
+
+from heptools.spin_tools import awkward_spins
+
+
+@pytest.mark.parametrize("match_decays", [False, True])
+def test_parse_without_events(lhe_files, tmp_path, match_decays):
+    # An empty file gives an empty array with the fields of a file with events
+    path = tmp_path / "empty.lhe"
+    path.write_text('<LesHouchesEvents version="3.0">\n<init>\n2212 2212 6.5e3 6.5e3 0 0 247000 247000 -4 1\n</init>\n</LesHouchesEvents>\n')
+    empty  = awkward_spins.parse(str(path), match_decays=match_decays)
+    events = awkward_spins.parse(lhe_files["plain"], match_decays=match_decays)
+    assert len(empty) == 0
+    assert str(ak.type(empty).content) == str(ak.type(events).content)
+
+
+def test_parse_without_matched_decays(lhe_files):
+    events = awkward_spins.parse(lhe_files["plain"], match_decays=True, lepton_ids=(15,), step_size=64)
+    assert len(events) == 0
+    assert events.fields == ["eventinfo", "event_index", "tops", "anti_tops", "pos_leptons", "neg_leptons"]
+
+
+def test_parse_matches_every_dileptonic_event(lhe_files):
+    events = awkward_spins.parse(lhe_files["plain"], match_decays=True, step_size=64)
+    assert ak.to_list(events.event_index) == list(range(200))
+    assert ak.all(events.pos_leptons.t > 0) and ak.all(events.neg_leptons.t > 0)
+
+
+@pytest.mark.parametrize("weighted", [False, True])
+def test_accumulator_matches_compute_spin_parameters(lhe_files, weighted):
+    # Identical up to summation order, however the events are chunked and merged
+    events      = awkward_spins.parse(lhe_files["plain"])
+    observables = awkward_spins.helicity_basis_observables(*awkward_spins.boost(events))
+    weights     = events.eventinfo.weight.to_numpy() if weighted else None
+    reference   = awkward_spins.compute_spin_parameters(observables, weights, uncertainties=True)
+
+    chunked = awkward_spins.accumulate(lhe_files["plain"], step_size=16, weighted=weighted)
+    merged  = sum(awkward_spins.SpinAccumulator().fill(observables[i:i + 70], None if weights is None else weights[i:i + 70])
+                  for i in range(0, len(events), 70))
+    for accumulator in (chunked, merged):
+        values, errors, cov = accumulator.finalize()
+        assert values.keys() == reference[0].keys()
+        assert np.allclose(list(values.values()), list(reference[0].values()), rtol=1e-12, atol=1e-14)
+        assert np.allclose(list(errors.values()), list(reference[1].values()), rtol=1e-12, atol=1e-14)
+        assert np.allclose(cov, reference[2], rtol=1e-12, atol=1e-14)
+
+
+def test_bootstrap_does_not_depend_on_processes_or_chunks(lhe_files):
+    # Identical up to summation order for any split of the events
+    reference = awkward_spins.bootstrap(lhe_files["plain"], nreplicas=20, seed=3, step_size=10000)
+    assert reference["replicas"].shape == (20, len(awkward_spins.SPIN_PARAMETERS))
+    for kind, processes, step_size in (("plain", 1, 16), ("plain", 3, 7), ("gz", 2, 50)):
+        result = awkward_spins.bootstrap(lhe_files[kind], nreplicas=20, seed=3, processes=processes, step_size=step_size)
+        assert np.allclose(result["replicas"], reference["replicas"], rtol=1e-12, atol=1e-14)
+        assert np.allclose(result["correlation"], reference["correlation"], rtol=1e-10, atol=1e-12)
+    other_seed = awkward_spins.bootstrap(lhe_files["plain"], nreplicas=20, seed=4)
+    assert not np.allclose(other_seed["replicas"], reference["replicas"])
+
+
+def test_bootstrap_of_several_files(lhe_files):
+    # Events are numbered across the files, so two files are the bootstrap of their concatenation
+    reference   = awkward_spins.bootstrap([lhe_files["plain"]] * 2, nreplicas=10, processes=2)
+    events      = awkward_spins.parse(lhe_files["plain"])
+    observables = awkward_spins.helicity_basis_observables(*awkward_spins.boost(events))
+    accumulator = (awkward_spins.BootstrapAccumulator(10).fill(observables, np.arange(200))
+                   + awkward_spins.BootstrapAccumulator(10).fill(observables, np.arange(200, 400)))
+    assert np.allclose(accumulator.finalize()["replicas"], reference["replicas"], rtol=1e-12, atol=1e-14)
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+import vector
+
+from heptools.spin_observables import SPIN_BASES, cos_phi, helicity_basis_angular_observables
+
+
+@pytest.fixture(scope="module")
+def directions():
+    # Random unit top directions in the ttbar frame, both hemispheres, and their velocities
+    rng  = np.random.default_rng(2)
+    k    = rng.normal(size=(3, 1000))
+    k   /= np.sqrt((k**2).sum(axis=0))
+    beta = rng.uniform(0, 0.99, size=1000)
+    return tuple(k), beta
+
+
+@pytest.mark.parametrize("name", list(SPIN_BASES))
+def test_basis_is_right_handed_orthonormal(directions, name):
+    k, beta = directions
+    axes = np.array([np.broadcast_to(np.asarray(component, dtype=float), beta.shape)
+                     for axis in SPIN_BASES[name].build(k, beta) for component in axis]).reshape(3, 3, -1)
+    gram = np.einsum("aie,bie->abe", axes, axes)
+    assert np.allclose(gram, np.eye(3)[:, :, None])
+    assert np.allclose(np.linalg.det(np.moveaxis(axes, -1, 0)), 1)
+
+
+def test_off_diagonal_limits(directions):
+    # The beam axis closest to the top at threshold, the top direction for beta -> 1
+    k, beta = directions
+    threshold, _, _ = SPIN_BASES["off_diagonal"].build(k, np.zeros_like(beta))
+    assert np.allclose(threshold[2], np.sign(k[2]))
+    ultra, _, _ = SPIN_BASES["off_diagonal"].build(k, np.ones_like(beta))
+    assert np.allclose(ultra, k)
+
+
+@pytest.mark.parametrize("coordinates", [("x", "y", "z", "t"), ("px", "py", "pz", "E")])
+def test_single_events_of_any_4d_vector(coordinates):
+    # Plain VectorObject4D and MomentumObject4D give the observables of the vector library boosts
+    values = [(10., 20., 30., 200.), (-10., -25., 5., 210.), (5., 15., 20., 26.), (-8., -12., 3., 15.)]
+    top, antitop, lepP, lepM = (vector.obj(**dict(zip(coordinates, p))) for p in values)
+    ttbar  = top + antitop
+    top_cm, antitop_cm = top.boostCM_of(ttbar), antitop.boostCM_of(ttbar)
+    lepP_direction = lepP.boostCM_of(ttbar).boostCM_of(top_cm).to_beta3().unit()
+    lepM_direction = lepM.boostCM_of(ttbar).boostCM_of(antitop_cm).to_beta3().unit()
+    Kdirection     = top_cm.to_beta3().unit()
+
+    observables = helicity_basis_angular_observables(top, antitop, lepP, lepM)
+    assert observables["cos_phi"] == pytest.approx(lepP_direction.dot(lepM_direction), abs=1e-12)
+    assert observables["cos_k_p"] == pytest.approx(Kdirection.dot(lepP_direction), abs=1e-12)
+    assert observables["cos_k_m"] == pytest.approx(-Kdirection.dot(lepM_direction), abs=1e-12)
+    assert cos_phi(top, antitop, lepP, lepM) == pytest.approx(observables["cos_phi"], abs=1e-12)
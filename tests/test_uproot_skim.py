@@ -0,0 +1,125 @@
+import awkward as ak
+import numpy as np
+import pytest
+import uproot
+
+from heptools.uproot_skim import columnar_skim, counter_name, selection_cuts
+
+
+def make_tree(path, nentries, seed):
+
+    """ Tree t of integer and floating-point scalars of several widths and a jagged branch lep_pt, counted by nlep_pt """
+
+    rng  = np.random.default_rng(seed)
+    nlep = rng.integers(0, 4, size=nentries)
+    branches = {"run"   : np.full(nentries, seed, dtype=np.int32),
+                "event" : np.arange(nentries, dtype=np.int64) + 1000 * seed,
+                "met"   : rng.exponential(50., size=nentries),
+                "njets" : rng.integers(0, 8, size=nentries).astype(np.int32),
+                "lep_pt": ak.unflatten(rng.exponential(30., size=nlep.sum()).astype(np.float32), nlep)}
+    with uproot.recreate(path) as f:
+        f.mktree("t", {name: ak.type(array).content for name, array in branches.items()}, counter_name=counter_name)
+        f["t"].extend(branches)
+    return branches
+
+
+@pytest.fixture(scope="module")
+def trees(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("skim")
+    paths     = [str(directory / f"in{i}.root") for i in range(2)]
+    inputs    = [make_tree(path, 50 + 25 * i, seed=i + 1) for i, path in enumerate(paths)]
+    joined    = {name: ak.concatenate([branches[name] for branches in inputs]) for name in inputs[0]}
+    return paths, joined
+
+
+def read(path, tree="t_skimmed"):
+    with uproot.open(path) as f:
+        return f[tree].arrays(library="ak"), {name: branch.typename for name, branch in f[tree].items()}
+
+
+def test_types_are_preserved(trees, tmp_path):
+    (path, _), joined = trees
+    output = str(tmp_path / "out.root")
+    with uproot.open(path) as f:
+        types = {name: branch.typename for name, branch in f["t"].items()}
+    cutflow = columnar_skim(path, "t", ["run", "event", "met", "lep_pt", "nlep_pt"], file_name=output)
+    skimmed, skimmed_types = read(output)
+
+    # The kept counter of lep_pt is written once, by uproot
+    assert sorted(skimmed.fields) == ["event", "lep_pt", "met", "nlep_pt", "run"]
+    assert {name: skimmed_types[name] for name in skimmed.fields} == {name: types[name] for name in skimmed.fields}
+    assert cutflow == {"All entries": 50}
+    for name in ("run", "event", "met", "lep_pt"):
+        assert ak.to_list(skimmed[name]) == ak.to_list(joined[name][:50])
+    assert ak.to_list(skimmed["nlep_pt"]) == ak.to_list(ak.num(joined["lep_pt"][:50]))
+
+
+@pytest.mark.parametrize("cut_off", [20, 21, 50])
+def test_cut_off_across_chunks(trees, tmp_path, cut_off):
+    (path, _), joined = trees
+    output = str(tmp_path / "out.root")
+    columnar_skim(path, "t", ["event", "lep_pt"], file_name=output, output_tree_name="skim", cut_off=cut_off, step_size=7)
+    skimmed, _ = read(output, "skim")
+    assert ak.to_list(skimmed.event) == ak.to_list(joined["event"][:cut_off])
+    assert ak.to_list(skimmed.lep_pt) == ak.to_list(joined["lep_pt"][:cut_off])
+
+
+@pytest.mark.parametrize("cut_off", [None, 60])
+def test_chain_of_files(trees, tmp_path, cut_off):
+    paths, joined = trees
+    output  = str(tmp_path / "out.root")
+    cutflow = columnar_skim(paths, "t", ["run", "event", "lep_pt"], file_name=output, cut_off=cut_off, step_size=16)
+    skimmed, _ = read(output)
+    total = 125 if cut_off is None else cut_off
+    assert cutflow == {"All entries": total}
+    for name in ("run", "event", "lep_pt"):
+        assert ak.to_list(skimmed[name]) == ak.to_list(joined[name][:total])
+
+
+def test_selection_cuts():
+    assert selection_cuts("(njets >= 4) & ((met > 20) | (run == 1)) & (ak.num(lep_pt) > 0)") == \
+        ["njets >= 4", "(met > 20) | (run == 1)", "ak.num(lep_pt) > 0"]
+    assert selection_cuts(["njets >= 4", "(met > 20) & (run == 1)"]) == ["njets >= 4", "met > 20", "run == 1"]
+    assert selection_cuts(None) == []
+
+
+def test_guarded_cut_and_cutflow(trees, tmp_path):
+    # The index cut is only evaluated on the entries with a lepton
+    paths, joined = trees
+    output  = str(tmp_path / "out.root")
+    cutflow = columnar_skim(paths, "t", ["event", "met", "lep_pt"], file_name=output, step_size=16,
+                            selection="(ak.num(lep_pt) > 0) & (lep_pt[:, 0] > 20) & (njets >= 2)")
+    has_lepton = np.asarray(ak.num(joined["lep_pt"]) > 0)
+    leading    = has_lepton & np.asarray(ak.fill_none(ak.firsts(joined["lep_pt"]) > 20, False))
+    passing    = leading & (np.asarray(joined["njets"]) >= 2)
+    assert list(cutflow.values()) == [125, has_lepton.sum(), leading.sum(), passing.sum()]
+    assert list(cutflow) == ["All entries", "ak.num(lep_pt) > 0", "lep_pt[:, 0] > 20", "njets >= 2"]
+
+    skimmed, _ = read(output)
+    assert sorted(skimmed.fields) == ["event", "lep_pt", "met", "nlep_pt"]
+    for name in ("event", "met", "lep_pt"):
+        assert ak.to_list(skimmed[name]) == ak.to_list(joined[name][passing])
+
+
+def test_deferred_branches_read_for_passing_chunks(trees, tmp_path, monkeypatch):
+    # Only the event branch is read for every chunk, met for the last of the 5 chunks
+    (path, _), joined = trees
+    reads = []
+    arrays = uproot.behaviors.TBranch.HasBranches.arrays
+    def logged_arrays(self, expressions=None, *args, **kwargs):
+        reads.append((list(expressions or []), kwargs.get("entry_start")))
+        return arrays(self, expressions, *args, **kwargs)
+    monkeypatch.setattr(uproot.behaviors.TBranch.HasBranches, "arrays", logged_arrays)
+
+    output  = str(tmp_path / "out.root")
+    cutflow = columnar_skim(path, "t", ["event", "met"], file_name=output, step_size=10, selection="event >= 1045")
+    assert cutflow == {"All entries": 50, "event >= 1045": 5}
+    assert [(expressions, start) for expressions, start in reads if "met" in expressions and start is not None] == [(["met"], 40)]
+    skimmed, _ = read(output)
+    assert ak.to_list(skimmed.met) == ak.to_list(joined["met"][45:50])
+
+
+def test_cut_not_one_boolean_per_entry(trees, tmp_path):
+    (path, _), _ = trees
+    with pytest.raises(ValueError, match="not one boolean per entry"):
+        columnar_skim(path, "t", ["event"], file_name=str(tmp_path / "out.root"), selection="lep_pt > 20")